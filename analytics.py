@@ -0,0 +1,137 @@
+"""
+Turnout and demographic analytics for the current election.
+
+Computes turnout by age band, turnout over time and vote share per candidate.
+The aggregation happens inside SQLite, so Python only sees the grouped rows,
+never one row per voter:
+    - registered voters and voters who voted (participation joined to the
+      roll, as in the turnout export) are counted per birth year by GROUP BY
+      queries, re-run only when the roll changes,
+    - otherwise ballots are folded in incrementally: each refresh groups only
+      the ballots past the last one seen by (birth year, minute cast), so during
+      voting the cost follows the new ballots, not the size of the roll,
+    - the (few dozen) grouped rows are then bucketed into age bands and time
+      slots in Python.
+Turnout over time counts ballots as they were cast, so it does not drop when
+a voter who voted is later removed from the roll.
+A snapshot is cached until the ballot sequence, the current election or the
+roll (voter_stats change counter) changes, so polling it costs one small read.
+"""
+import datetime
+import threading
+import time
+
+import voting_engine
+
+AGE_BANDS = ((18, 24), (25, 34), (35, 44), (45, 54), (55, 64), (65, None)) # Inclusive; None = no upper limit
+
+
+def age_band(age):
+    """Label of the band an age falls in, or None if younger than the first band."""
+    for low, high in AGE_BANDS:
+        if age >= low and (high is None or age <= high):
+            return f"{low}+" if high is None else f"{low}-{high}"
+    return None
+
+
+class Analytics:
+    """
+    Cached, incrementally updated analytics. One instance can serve several
+    connections (e.g. the GUI's worker threads); calls are serialized.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+        self._election_id = None
+        self._roll = None     # (registered, changes) the per-birth-year counts were built for
+        self._seen_seq = 0    # Last ballot folded into the counts below
+        self._registered = {} # birth_year -> registered voters
+        self._voted = {}      # birth_year -> registered voters who voted in the current election
+        self._per_minute = {} # 'YYYY-MM-DD HH:MM' -> ballots cast in that minute
+
+    @staticmethod
+    def _read_version(conn):
+        return voting_engine.results_version(conn) + voting_engine.voter_roll_version(conn)
+
+    def snapshot(self, conn):
+        """Returns the analytics dict for the current election, recomputing only what changed since the last call."""
+        with self._lock:
+            if self._read_version(conn) == self._version:
+                return self._snapshot
+            started = time.perf_counter()
+            conn.execute("BEGIN") # One snapshot, so the roll counts, the folded ballots and the results agree
+            try:
+                results = voting_engine.tally(conn)
+                version = self._read_version(conn)
+                head, election_id, registered_total, changes = version
+                if election_id != self._election_id:
+                    self._election_id, self._seen_seq, self._per_minute = election_id, 0, {}
+                    self._roll = None
+                rebuild = (registered_total, changes) != self._roll
+                if rebuild:
+                    self._count_roll(conn)
+                    self._roll = (registered_total, changes)
+                self._fold_ballots(conn, head, count_voters=not rebuild)
+            finally:
+                conn.commit()
+            self._snapshot = self._build(head, registered_total, results, time.perf_counter() - started)
+            self._version = version
+            return self._snapshot
+
+    def _count_roll(self, conn):
+        """Recounts registered and voted voters per birth year from the roll and participation."""
+        self._registered = dict(conn.execute("SELECT birth_year, COUNT(*) FROM voters GROUP BY birth_year"))
+        self._voted = dict(conn.execute("""
+            SELECT v.birth_year, COUNT(*) FROM participation p JOIN voters v ON v.username = p.username
+            WHERE p.election_id = ? GROUP BY v.birth_year
+            """, (self._election_id,)))
+
+    def _fold_ballots(self, conn, head, count_voters):
+        """Adds the current election's ballots past the last seen seq, grouped in SQL."""
+        for birth_year, minute, voters, ballots in conn.execute("""
+                SELECT v.birth_year, substr(b.cast_at, 1, 16), COUNT(v.username), COUNT(*)
+                FROM ballots b LEFT JOIN voters v ON v.username = b.username
+                WHERE b.seq > ? AND b.seq <= ? AND b.election_id = ?
+                GROUP BY 1, 2
+                """, (self._seen_seq, head, self._election_id)):
+            if count_voters and voters:
+                self._voted[birth_year] = self._voted.get(birth_year, 0) + voters
+            self._per_minute[minute] = self._per_minute.get(minute, 0) + ballots
+        self._seen_seq = head
+
+    def _build(self, head, registered_total, results, seconds):
+        current_year = datetime.datetime.now().year
+        bands = {}
+        for birth_year in set(self._registered) | set(self._voted):
+            label = age_band(current_year - birth_year) if birth_year is not None else None
+            if label is None:
+                continue
+            registered, voted = bands.get(label, (0, 0))
+            bands[label] = (registered + self._registered.get(birth_year, 0), voted + self._voted.get(birth_year, 0))
+        age_bands = []
+        for low, high in AGE_BANDS:
+            label = f"{low}+" if high is None else f"{low}-{high}"
+            registered, voted = bands.get(label, (0, 0))
+            age_bands.append((label, registered, voted, voted / registered if registered else 0.0))
+
+        timeline = []
+        cast = 0
+        for minute in sorted(self._per_minute):
+            cast += self._per_minute[minute]
+            timeline.append((minute, self._per_minute[minute], cast / registered_total if registered_total else 0.0))
+
+        voted_total = sum(self._voted.values())
+        total_votes = sum(votes for _, votes in results)
+        return {
+            "election_id": self._election_id,
+            "ballot_seq": head,
+            "registered": registered_total,
+            "voted": voted_total,
+            "turnout": voted_total / registered_total if registered_total else 0.0,
+            "age_bands": age_bands,
+            "timeline": timeline,
+            "shares": [(party, votes, votes / total_votes if total_votes else 0.0) for party, votes in results],
+            "seconds": seconds,
+        }
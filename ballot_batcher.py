@@ -0,0 +1,136 @@
+"""
+Group commit for the cast-vote path.
+
+Casting one ballot per transaction pays a full fsync per vote. BallotBatcher
+queues casts from any number of threads, and a single writer thread commits
+everything that arrives within a few milliseconds in one transaction. Callers
+only get their confirmation once the transaction holding their ballot has
+committed, so a confirmed vote is as durable as with voting_engine.cast_vote.
+If the writer thread fails (it cannot open the database, or a commit or rollback
+raises), every ballot still waiting gets that error and later casts raise it at once.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import voting_engine
+from voting_engine import VotingError
+
+DEFAULT_MAX_DELAY = 0.005 # Seconds to wait for more ballots after the first one in a batch
+DEFAULT_MAX_BATCH = 512
+
+_STOP = object()
+
+
+class BallotBatcher:
+    """Collects ballots from many threads and commits them in batches on one writer connection."""
+
+    def __init__(self, db_path=voting_engine.DB_PATH, max_delay=DEFAULT_MAX_DELAY, max_batch=DEFAULT_MAX_BATCH):
+        self.db_path = db_path
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._error = None    # Set when the writer thread has died
+        self._batch = ()      # Ballots the writer is committing
+        self._lock = threading.Lock() # Orders submits against the writer failing
+        self._thread = threading.Thread(target=self._run, name="ballot-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, username, party_name):
+        """Queues a ballot and returns a Future that resolves once it has been committed."""
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                raise RuntimeError(f"BallotBatcher writer failed: {self._error!r}") from self._error
+            if self._closed:
+                raise RuntimeError("BallotBatcher is closed")
+            self._queue.put((username, party_name, future))
+        return future
+
+    def cast_vote(self, username, party_name, timeout=None):
+        """Queues a ballot and blocks until it is committed. Raises VotingError if it was rejected."""
+        return self.submit(username, party_name).result(timeout)
+
+    def close(self):
+        """Commits everything already queued and stops the writer thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _next_batch(self):
+        """Blocks for the first ballot, then gathers whatever else arrives before the deadline."""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        try:
+            conn = voting_engine.connect(self.db_path, create_schema=False)
+            try:
+                stopping = False
+                while not stopping:
+                    batch, stopping = self._next_batch()
+                    if batch:
+                        self._batch = batch
+                        self._commit_batch(conn, batch)
+                        self._batch = ()
+            finally:
+                conn.close()
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        """Fails the batch in flight and everything queued with error; later submits raise it."""
+        with self._lock:
+            self._error = error
+        for _, _, future in self._batch:
+            if not future.done():
+                future.set_exception(error)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[2].set_exception(error)
+
+    def _commit_batch(self, conn, batch):
+        rejected = {}
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for index, (username, party_name, _) in enumerate(batch):
+                # A savepoint per ballot lets one rejected ballot roll back without losing the others
+                conn.execute("SAVEPOINT ballot")
+                try:
+                    voting_engine.record_vote(conn, username, party_name)
+                except VotingError as e:
+                    conn.execute("ROLLBACK TO ballot")
+                    rejected[index] = e
+                conn.execute("RELEASE ballot")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for index, (_, _, future) in enumerate(batch):
+            if index in rejected:
+                future.set_exception(rejected[index])
+            else:
+                future.set_result(None)
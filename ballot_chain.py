@@ -0,0 +1,357 @@
+"""
+Tamper-evident hash chain over the ballot ledger.
+
+Every ballot row stores chain_hash = SHA-256(previous chain_hash + the ballot's
+fields), starting from 32 zero bytes, so editing, inserting or deleting a
+ballot anywhere breaks the chain from that point on. Every CHECKPOINT_INTERVAL
+ballots a checkpoint records the chain hash reached and the Merkle root of the
+interval's entry hashes; a single ballot can then be proven to be in a
+checkpoint with a short proof (prove / verify_proof) instead of the whole
+interval.
+
+Verification comes in two sizes:
+    - incremental (the default): re-hashes only the ballots after the last
+      checkpoint, and checks that every checkpoint still matches the ballot it
+      points at. Its cost depends on recent activity, not on the election size.
+    - full: one streaming pass over the whole ledger that recomputes the chain,
+      every checkpoint's Merkle root and the per-party counts the tallies
+      should hold (following logged candidate renames and deletions), so an
+      out-of-band edit of the tallies shows up as well.
+Someone with write access can rewrite the whole chain and its checkpoints, so
+copy the checkpoints off the machine (`checkpoints` command) and pass that copy
+back with --trusted: verification then also proves that history up to the
+last trusted checkpoint is unchanged.
+
+This module only needs a connection, so migrations can use it; it does not
+import voting_engine.
+
+Run with: python ballot_chain.py verify --db voting.db [--full] [--trusted checkpoints.json]
+          python ballot_chain.py checkpoints --db voting.db > checkpoints.json
+          python ballot_chain.py prove --db voting.db 12345
+"""
+import argparse
+import bisect
+import datetime
+import hashlib
+import json
+import sqlite3
+import sys
+
+GENESIS = bytes(32) # The "previous hash" of the first ballot
+CHECKPOINT_INTERVAL = 10000 # Ballots per checkpoint
+PROBLEMS_SHOWN = 20 # Verification stops collecting details after this many problems
+_CHAIN_BATCH = 10000 # Ballots hashed per batch by chain_pending
+
+_BALLOT_FIELDS = "seq, election_id, username, party_name, shard, cast_at, station, station_seq, chain_hash"
+
+
+# --- Chain and Merkle primitives ---
+def entry_hash(previous, election_id, username, party_name, shard, cast_at, station=None, station_seq=None):
+    """Chain hash of a ballot given the previous entry's chain hash."""
+    record = json.dumps([election_id, username, party_name, shard, cast_at, station, station_seq],
+                        separators=(",", ":"))
+    return hashlib.sha256(previous + record.encode("utf-8")).digest()
+
+def _node(left, right):
+    # Prefixed so an interior node can never be mistaken for an entry hash
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def merkle_root(leaves):
+    """Root of the Merkle tree over leaves; an odd node at the end of a level moves up unchanged."""
+    level = list(leaves)
+    if not level:
+        return GENESIS
+    while len(level) > 1:
+        level = [_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+    return level[0]
+
+def merkle_proof(leaves, index):
+    """Sibling hashes from leaves[index] up to the root, as ("left" | "right", hash) pairs."""
+    proof = []
+    level = list(leaves)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(("left" if sibling < index else "right", level[sibling]))
+        level = [_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+        index //= 2
+    return proof
+
+def verify_proof(leaf, proof, root):
+    """True if proof (from merkle_proof) links leaf to root."""
+    node = leaf
+    for side, sibling in proof:
+        node = _node(sibling, node) if side == "left" else _node(node, sibling)
+    return node == root
+
+def chain_pending(conn):
+    """
+    Hashes ballots that were written without a chain hash (ballots from before the
+    chain existed, or bulk-loaded ones), in seq order, inside the caller's
+    transaction. Returns the number chained.
+    """
+    row = conn.execute("SELECT seq, chain_hash FROM ballots WHERE chain_hash IS NOT NULL ORDER BY seq DESC LIMIT 1").fetchone()
+    last_seq, previous = row if row else (0, GENESIS)
+    chained = 0
+    while True:
+        rows = conn.execute("""
+            SELECT seq, election_id, username, party_name, shard, cast_at, station, station_seq
+            FROM ballots WHERE seq > ? ORDER BY seq LIMIT ?
+        """, (last_seq, _CHAIN_BATCH)).fetchall()
+        if not rows:
+            return chained
+        updates = []
+        for seq, *fields in rows:
+            previous = entry_hash(previous, *fields)
+            updates.append((previous, seq))
+        conn.executemany("UPDATE ballots SET chain_hash=? WHERE seq=?", updates)
+        last_seq = rows[-1][0]
+        chained += len(rows)
+
+
+# --- Checkpoints ---
+def last_checkpoint(conn):
+    """Returns (seq, chain_hash) of the newest checkpoint, or (0, GENESIS) if there is none."""
+    row = conn.execute("SELECT seq, chain_hash FROM chain_checkpoints ORDER BY seq DESC LIMIT 1").fetchone()
+    return row if row else (0, GENESIS)
+
+def create_checkpoints(conn, interval=CHECKPOINT_INTERVAL):
+    """
+    Adds a checkpoint for every complete interval of ballots past the last one,
+    inside the caller's transaction. Returns the number created. Costs one lookup
+    when no checkpoint is due.
+    """
+    last_seq = last_checkpoint(conn)[0]
+    head = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ballots").fetchone()[0]
+    created = 0
+    while head - last_seq >= interval:
+        rows = conn.execute("SELECT seq, chain_hash FROM ballots WHERE seq > ? ORDER BY seq LIMIT ?",
+                            (last_seq, interval)).fetchall()
+        if len(rows) < interval:
+            break # Gaps in seq: not enough ballots yet
+        conn.execute("""
+            INSERT INTO chain_checkpoints (seq, first_seq, entries, chain_hash, merkle_root, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (rows[-1][0], rows[0][0], len(rows), rows[-1][1], merkle_root([r[1] for r in rows]),
+              datetime.datetime.now().isoformat(sep=" ", timespec="seconds")))
+        last_seq = rows[-1][0]
+        created += 1
+    return created
+
+def list_checkpoints(conn):
+    """Returns the checkpoints as dicts with hex hashes, in the format --trusted reads back."""
+    return [{"seq": seq, "first_seq": first_seq, "entries": entries,
+             "chain_hash": chain_hash.hex(), "merkle_root": root.hex()}
+            for seq, first_seq, entries, chain_hash, root in conn.execute(
+                "SELECT seq, first_seq, entries, chain_hash, merkle_root FROM chain_checkpoints ORDER BY seq")]
+
+
+# --- Party renames ---
+# Ballots keep the party name they were cast for; tallies follow candidate renames and
+# drop a deleted candidate's votes. Ledger counts are kept per (party, epoch), the epoch
+# being how many of the election's renames came before the ballot, and then resolved
+# through the renames that came after it.
+def load_renames(conn):
+    """Returns {election_id: [(seq, old_name, new_name), ...]} in the order the changes were made."""
+    renames = {}
+    for election_id, seq, old_name, new_name in conn.execute(
+            "SELECT election_id, seq, old_name, new_name FROM party_renames ORDER BY id"):
+        renames.setdefault(election_id, []).append((seq, old_name, new_name))
+    return renames
+
+def rename_epoch(rename_seqs, seq):
+    """
+    Number of an election's renames made before ballot seq was cast, given the seqs
+    the renames were logged at, in order. Later renames (logged at seq or after) apply to it.
+    """
+    return bisect.bisect_left(rename_seqs, seq) if rename_seqs else 0
+
+def resolve_counts(counts, renames):
+    """
+    Maps {(party_name, epoch): votes} for one election to {party_name: votes} under the
+    names the tallies use now. Votes for deleted candidates are dropped.
+    """
+    resolved = {}
+    for (party_name, epoch), votes in counts.items():
+        for _, old_name, new_name in renames[epoch:]:
+            if party_name == old_name:
+                party_name = new_name
+                if party_name is None:
+                    break
+        if party_name is not None:
+            resolved[party_name] = resolved.get(party_name, 0) + votes
+    return resolved
+
+def compare_tallies(stored, expected, problems, label):
+    """
+    Adds a problem for every party whose tallies differ from the counts expected from
+    the ledger (tally-only and ledger-only parties included) and for a different total.
+    """
+    for party_name in sorted(set(stored) | set(expected), key=str):
+        if stored.get(party_name, 0) != expected.get(party_name, 0):
+            problems.append(f"{label}{party_name}: tallies show {stored.get(party_name, 0)} votes, "
+                            f"the ledger has {expected.get(party_name, 0)}.")
+    if sum(stored.values()) != sum(expected.values()):
+        problems.append(f"{label}tallies add up to {sum(stored.values())} votes, "
+                        f"the ledger has {sum(expected.values())} counted ballots.")
+
+
+# --- Verification ---
+def verify(conn, full=False, trusted=None):
+    """
+    Checks the chain (incrementally, or the whole ledger with full=True) and, if
+    given, a trusted copy of the checkpoints from list_checkpoints. Returns a report
+    dict; report["problems"] is empty when everything checks out.
+    """
+    problems = []
+    checkpoints = {seq: (first_seq, entries, chain_hash, root) for seq, first_seq, entries, chain_hash, root in
+                   conn.execute("SELECT seq, first_seq, entries, chain_hash, merkle_root FROM chain_checkpoints")}
+    checkpoint_count = len(checkpoints)
+    _check_trusted(checkpoints, trusted or [], problems)
+    for seq, (_, _, chain_hash, _) in sorted(checkpoints.items()):
+        row = conn.execute("SELECT chain_hash FROM ballots WHERE seq=?", (seq,)).fetchone()
+        if row is None or row[0] != chain_hash:
+            problems.append(f"Checkpoint at ballot {seq} no longer matches the ledger.")
+
+    if full:
+        start_seq, previous = 0, GENESIS
+    else:
+        start_seq, previous = last_checkpoint(conn)
+    applied_seq = conn.execute("SELECT applied_seq FROM tally_state WHERE id=1").fetchone()[0]
+    renames = load_renames(conn) if full else {}
+    rename_seqs = {election_id: [rename[0] for rename in changes] for election_id, changes in renames.items()}
+    counts = {} # (election_id, party_name, epoch) -> ballots
+    leaves = []
+    checked = broken = 0
+    for seq, election_id, username, party_name, shard, cast_at, station, station_seq, stored in conn.execute(
+            f"SELECT {_BALLOT_FIELDS} FROM ballots WHERE seq > ? ORDER BY seq", (start_seq,)):
+        expected = entry_hash(previous, election_id, username, party_name, shard, cast_at, station, station_seq)
+        if stored != expected:
+            broken += 1
+            if broken <= PROBLEMS_SHOWN:
+                problems.append(f"Ballot {seq} does not match the chain (edited, inserted or a ballot before it removed).")
+        previous = stored or expected # Carry on from the stored hash so one edit is reported once
+        checked += 1
+        if not full:
+            continue
+        if seq <= applied_seq:
+            key = (election_id, party_name, rename_epoch(rename_seqs.get(election_id), seq))
+            counts[key] = counts.get(key, 0) + 1
+        leaves.append(previous)
+        if seq in checkpoints:
+            first_seq, entries, _, root = checkpoints.pop(seq)
+            if len(leaves) != entries or merkle_root(leaves) != root:
+                problems.append(f"Merkle root of ballots {first_seq}-{seq} does not match its checkpoint.")
+            leaves = []
+    if broken > PROBLEMS_SHOWN:
+        problems.append(f"{broken:,} ballots in total do not match the chain.")
+    if full:
+        for seq in sorted(checkpoints):
+            problems.append(f"Checkpoint at ballot {seq} points past the end of the ledger.")
+        _check_tallies(conn, counts, renames, problems)
+
+    head = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ballots").fetchone()[0]
+    issued = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='ballots'").fetchone()[0]
+    if issued > head:
+        problems.append(f"Ballots {head + 1}-{issued} were removed from the end of the ledger.")
+    return {
+        "mode": "full" if full else "incremental",
+        "from_seq": start_seq,
+        "head": head,
+        "checked": checked,
+        "checkpoints": checkpoint_count,
+        "problems": problems[:PROBLEMS_SHOWN] + ([f"... and {len(problems) - PROBLEMS_SHOWN} more."]
+                                                 if len(problems) > PROBLEMS_SHOWN else []),
+    }
+
+def _check_trusted(checkpoints, trusted, problems):
+    for entry in trusted:
+        stored = checkpoints.get(entry["seq"])
+        if stored is None:
+            problems.append(f"Trusted checkpoint at ballot {entry['seq']} is missing.")
+        elif stored[2].hex() != entry["chain_hash"] or stored[3].hex() != entry["merkle_root"]:
+            problems.append(f"Checkpoint at ballot {entry['seq']} differs from the trusted copy.")
+
+def _check_tallies(conn, counts, renames, problems):
+    """Compares every election's tallies with the ledger's counts, renames and deletions applied."""
+    stored = {}
+    for election_id, party_name, votes in conn.execute("""
+            SELECT election_id, party_name, SUM(votes) FROM tallies GROUP BY election_id, party_name HAVING SUM(votes) != 0
+            """):
+        stored.setdefault(election_id, {})[party_name] = votes
+    by_election = {}
+    for (election_id, party_name, epoch), votes in counts.items():
+        by_election.setdefault(election_id, {})[(party_name, epoch)] = votes
+    for election_id in sorted(set(stored) | set(by_election)):
+        expected = resolve_counts(by_election.get(election_id, {}), renames.get(election_id, []))
+        compare_tallies(stored.get(election_id, {}), expected, problems, f"Election {election_id}, ")
+
+
+# --- Inclusion proofs ---
+def prove(conn, seq):
+    """
+    Returns a proof that ballot seq is part of its checkpoint, as a dict with hex
+    hashes, or None if the ballot is not covered by a checkpoint yet.
+    """
+    checkpoint = conn.execute("""
+        SELECT seq, first_seq, merkle_root FROM chain_checkpoints WHERE seq >= ? AND first_seq <= ?
+    """, (seq, seq)).fetchone()
+    if checkpoint is None:
+        return None
+    checkpoint_seq, first_seq, root = checkpoint
+    rows = conn.execute("SELECT seq, chain_hash FROM ballots WHERE seq BETWEEN ? AND ? ORDER BY seq",
+                        (first_seq, checkpoint_seq)).fetchall()
+    index = next((i for i, row in enumerate(rows) if row[0] == seq), None)
+    if index is None:
+        return None
+    leaves = [row[1] for row in rows]
+    return {"seq": seq, "entry_hash": leaves[index].hex(), "checkpoint": checkpoint_seq, "merkle_root": root.hex(),
+            "proof": [[side, sibling.hex()] for side, sibling in merkle_proof(leaves, index)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the ballot ledger's hash chain.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    verify_cmd = commands.add_parser("verify", help="check the chain (only new ballots unless --full)")
+    verify_cmd.add_argument("--full", action="store_true", help="re-hash the whole ledger and check the tallies")
+    verify_cmd.add_argument("--trusted", help="checkpoints JSON saved earlier with the checkpoints command")
+    verify_cmd.add_argument("--json", action="store_true", help="print the report as JSON")
+    commands.add_parser("checkpoints", help="print the checkpoints as JSON, to keep a copy elsewhere")
+    prove_cmd = commands.add_parser("prove", help="print a Merkle inclusion proof for one ballot")
+    prove_cmd.add_argument("seq", type=int)
+    for command in commands.choices.values():
+        command.add_argument("--db", default="voting.db", help="path to the voting database")
+    args = parser.parse_args()
+
+    # Read-only: an audit must not be able to change what it is checking
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        if args.command == "checkpoints":
+            print(json.dumps(list_checkpoints(conn), indent=2))
+        elif args.command == "prove":
+            proof = prove(conn, args.seq)
+            if proof is None:
+                parser.exit(1, f"Ballot {args.seq} is not covered by a checkpoint yet.\n")
+            print(json.dumps(proof, indent=2))
+        else:
+            trusted = None
+            if args.trusted:
+                with open(args.trusted, encoding="utf-8") as f:
+                    trusted = json.load(f)
+            report = verify(conn, args.full, trusted)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print(f"{report['mode'].capitalize()} check of ballots {report['from_seq'] + 1}-{report['head']}: "
+                      f"{report['checked']:,} re-hashed, {report['checkpoints']} checkpoints")
+                for problem in report["problems"]:
+                    print(f"  {problem}")
+                print("Ledger intact." if not report["problems"] else "LEDGER HAS BEEN MODIFIED.")
+            if report["problems"]:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Timer thread that enforces scheduled election start and end times without the GUI.
+
+Ballots are already checked against the stored time window when they are cast
+(see voting_engine.record_vote); this thread makes the stored status follow the
+clock as well, so /state, result releases and the status bar agree with it.
+It sleeps until the next scheduled change, waking at least every poll_interval
+seconds to notice schedules changed by other processes. The GUI does the same
+with root.after (see vm_1.run_election_schedule).
+"""
+import threading
+
+import voting_engine
+
+DEFAULT_POLL_INTERVAL = 1.0 # Seconds between checks when no change is due sooner
+
+
+class ElectionScheduler:
+    """Opens and closes the current election at its stored start and end times."""
+
+    def __init__(self, db_path=voting_engine.DB_PATH, poll_interval=DEFAULT_POLL_INTERVAL, on_change=None):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.on_change = on_change # Called with the new status after each switch
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="election-scheduler", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the timer thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        conn = voting_engine.connect(self.db_path, create_schema=False)
+        try:
+            while not self._stop.is_set():
+                # Reading the (cached) state is free; the write only happens once a change is due
+                upcoming = voting_engine.next_transition(voting_engine.get_election_state(conn))
+                if upcoming is not None and upcoming[0] == 0:
+                    changed = voting_engine.apply_schedule(conn)
+                    if changed and self.on_change:
+                        self.on_change(changed)
+                    continue
+                delay = self.poll_interval if upcoming is None else min(self.poll_interval, upcoming[0])
+                self._stop.wait(delay)
+        finally:
+            conn.close()
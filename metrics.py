@@ -0,0 +1,199 @@
+"""
+Timing instrumentation for the voting engine.
+
+Off by default. Set VOTING_METRICS=1 (or call enable() before opening
+connections) to record:
+    - latency histograms per operation (cast_vote, logins, voter pages, results...),
+    - SQL statement counts by kind, from sqlite3's trace callback, which also sees
+      the BEGIN/COMMIT statements issued implicitly and by `with conn:` blocks,
+    - SQL execution time by kind, from the connection's execute methods,
+    - commit counts.
+
+When disabled, a timed operation costs one flag check and connections are plain
+VotingConnections with no trace callback. The numbers can be read as Prometheus
+text (render_prometheus, served by vote_server.py at /metrics) or as JSON
+(snapshot, or start_periodic_dump to write a file every few seconds).
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEFAULT_DUMP_INTERVAL = 60.0
+
+_enabled = bool(os.environ.get("VOTING_METRICS"))
+_lock = threading.Lock()
+_operations = {}     # name -> Histogram
+_sql_seconds = {}    # statement kind -> Histogram
+_sql_statements = {} # statement kind -> count
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """Yields (upper bound, observations at or below it), ending with +Inf."""
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            yield bound, running
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile, or None without observations."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+
+
+# --- Switching on and off ---
+def enabled():
+    return _enabled
+
+def enable():
+    """Turns recording on. Connections opened before this stay uninstrumented."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    """Forgets everything recorded so far."""
+    with _lock:
+        _operations.clear()
+        _sql_seconds.clear()
+        _sql_statements.clear()
+
+
+# --- Recording ---
+def _observe(table, key, seconds):
+    with _lock:
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram()
+        histogram.observe(seconds)
+
+def observe(operation, seconds):
+    """Records one timing for operation."""
+    if _enabled:
+        _observe(_operations, operation, seconds)
+
+def timed(operation):
+    """Decorator that records the wall time of every call under operation, including failed ones."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _observe(_operations, operation, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def statement_kind(sql):
+    """First keyword of a statement (SELECT, INSERT, COMMIT, ...); statements run by triggers count as TRIGGER."""
+    sql = sql.lstrip()
+    if sql.startswith("--"):
+        return "TRIGGER"
+    return sql.split(None, 1)[0].upper() if sql else "EMPTY"
+
+def trace_statement(sql):
+    """sqlite3 trace callback: counts every statement the connection runs."""
+    kind = statement_kind(sql)
+    with _lock:
+        _sql_statements[kind] = _sql_statements.get(kind, 0) + 1
+
+def observe_sql(sql, seconds):
+    _observe(_sql_seconds, statement_kind(sql), seconds)
+
+
+# --- Reporting ---
+def snapshot():
+    """Everything recorded so far as plain data, ready for json.dumps."""
+    def describe(histogram):
+        return {"count": histogram.count, "seconds": histogram.total,
+                "p50_s": histogram.quantile(0.5), "p99_s": histogram.quantile(0.99),
+                "buckets": {str(bound): running for bound, running in histogram.cumulative()}}
+    with _lock:
+        return {
+            "enabled": _enabled,
+            "timestamp": time.time(),
+            "operations": {name: describe(h) for name, h in sorted(_operations.items())},
+            "sql_seconds": {kind: describe(h) for kind, h in sorted(_sql_seconds.items())},
+            "sql_statements": dict(sorted(_sql_statements.items())),
+            "commits": _sql_statements.get("COMMIT", 0),
+        }
+
+def _prometheus_histogram(lines, name, label, table):
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(table.items()):
+        for bound, running in histogram.cumulative():
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{le}"}} {running}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.total}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+
+def render_prometheus():
+    """Everything recorded so far in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        _prometheus_histogram(lines, "voting_operation_seconds", "operation", _operations)
+        _prometheus_histogram(lines, "voting_sql_seconds", "kind", _sql_seconds)
+        lines.append("# TYPE voting_sql_statements_total counter")
+        for kind, count in sorted(_sql_statements.items()):
+            lines.append(f'voting_sql_statements_total{{kind="{kind}"}} {count}')
+        lines.append("# TYPE voting_commits_total counter")
+        lines.append(f"voting_commits_total {_sql_statements.get('COMMIT', 0)}")
+    return "\n".join(lines) + "\n"
+
+def dump_json(path):
+    """Writes snapshot() to path, replacing the file in one step so readers never see half a dump."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(temp_path, path)
+
+def start_periodic_dump(path=None, interval=None):
+    """
+    Writes a JSON dump every interval seconds on a daemon thread. path and interval default to
+    VOTING_METRICS_DUMP and VOTING_METRICS_DUMP_INTERVAL. Returns the thread, or None when
+    metrics are off or no path is configured.
+    """
+    path = path or os.environ.get("VOTING_METRICS_DUMP")
+    interval = interval or float(os.environ.get("VOTING_METRICS_DUMP_INTERVAL", DEFAULT_DUMP_INTERVAL))
+    if not _enabled or not path:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_json(path)
+            except OSError:
+                pass # A full or read-only disk must not take the polling station down
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,447 @@
+"""
+Versioned schema migrations for the voting database.
+
+The schema version lives in PRAGMA user_version. migrate() applies every
+migration newer than that version, each in its own transaction, records how
+long it took in the schema_migrations table, and bumps the version. Running
+it on an up-to-date database costs one PRAGMA read, so it is safe to call at
+every startup. Every step is written to be idempotent, so databases created
+before versioning (user_version 0 with some tables already present) upgrade
+cleanly too.
+
+Run with: python migrations.py --db voting.db [--without-rowid] [--hash-passwords]
+"""
+import argparse
+import datetime
+import re
+import sqlite3
+import time
+
+import ballot_chain
+import passwords
+
+_HASH_BATCH = 1000 # Passwords hashed per round trip to the worker pool, and per transaction
+_PASSWORD_TABLES = (("admin", "username"), ("voters", "username"), ("candidates", "party_name"))
+
+def _column_names(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# --- Migrations ---
+def _create_base_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS admin (
+        username TEXT PRIMARY KEY,
+        password TEXT
+    )""")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS voters (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        birth_year INTEGER,
+        voted INTEGER DEFAULT 0
+    )""")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS candidates (
+        party_name TEXT PRIMARY KEY,
+        leader_name TEXT,
+        password TEXT,
+        votes INTEGER DEFAULT 0
+    )""")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS election_state (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        status TEXT DEFAULT 'Pending', -- 'Pending', 'Active', 'Closed'
+        start_time TEXT,
+        end_time TEXT,
+        results_released INTEGER DEFAULT 0
+    )""")
+
+    # Databases from before results_released existed have the table without it
+    if "results_released" not in _column_names(conn, "election_state"):
+        conn.execute("ALTER TABLE election_state ADD COLUMN results_released INTEGER DEFAULT 0")
+
+    # Ensure there's always one row in election_state
+    conn.execute("INSERT OR IGNORE INTO election_state (id, status, results_released) VALUES (1, 'Pending', 0)")
+
+def _create_vote_shards(conn):
+    # Optional sharded vote counters: ballots cast with a shard number are tallied into
+    # their own (party_name, shard) row instead of the single candidates.votes row.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS vote_shards (
+        party_name TEXT,
+        shard INTEGER,
+        votes INTEGER DEFAULT 0,
+        PRIMARY KEY (party_name, shard)
+    )""")
+
+def _create_ballot_ledger(conn):
+    # Append-only ballot ledger. Every accepted ballot gets a row here; the vote
+    # counters are a tally materialized from it (see voting_engine.refresh_tally).
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ballots (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        party_name TEXT,
+        shard INTEGER,
+        cast_at TEXT
+    )""")
+
+    # applied_seq: last ballot folded into the vote counters.
+    # reset_seq: last ballot cast before the most recent election reset.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tally_state (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        applied_seq INTEGER DEFAULT 0,
+        reset_seq INTEGER DEFAULT 0
+    )""")
+    conn.execute("INSERT OR IGNORE INTO tally_state (id, applied_seq, reset_seq) VALUES (1, 0, 0)")
+
+def _create_lookup_indexes(conn):
+    # Admin filters and turnout queries. username is appended so keyset pages
+    # (ORDER BY username) under a filter can walk the index in order.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_voters_voted ON voters (voted, username)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_voters_birth_year ON voters (birth_year, username)")
+
+def _create_voter_count(conn):
+    # Registered-voter count kept up to date by triggers, so turnout never needs COUNT(*) over voters
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS voter_stats (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        registered INTEGER DEFAULT 0
+    )""")
+    conn.execute("INSERT OR REPLACE INTO voter_stats (id, registered) VALUES (1, (SELECT COUNT(*) FROM voters))")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS voters_count_insert AFTER INSERT ON voters
+    BEGIN
+        UPDATE voter_stats SET registered = registered + 1 WHERE id = 1;
+    END""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS voters_count_delete AFTER DELETE ON voters
+    BEGIN
+        UPDATE voter_stats SET registered = registered - 1 WHERE id = 1;
+    END""")
+
+def _create_elections(conn):
+    # First-class elections. The newest row is the current election; older rows are history.
+    # Who voted and the tallies are kept per election, so starting a new one touches no voter rows.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS elections (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        status TEXT DEFAULT 'Pending', -- 'Pending', 'Active', 'Closed', 'Discarded'
+        start_time TEXT,
+        end_time TEXT,
+        results_released INTEGER DEFAULT 0,
+        created_at TEXT
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS participation (
+        election_id INTEGER,
+        username TEXT,
+        PRIMARY KEY (election_id, username)
+    ) WITHOUT ROWID""")
+    # Per-election vote counters, materialized from the ballot ledger. shard 0 holds unsharded ballots.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tallies (
+        election_id INTEGER,
+        party_name TEXT,
+        shard INTEGER,
+        votes INTEGER DEFAULT 0,
+        PRIMARY KEY (election_id, party_name, shard)
+    )""")
+    if "election_id" not in _column_names(conn, "ballots"):
+        conn.execute("ALTER TABLE ballots ADD COLUMN election_id INTEGER")
+
+    created_at = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='election_state'").fetchone():
+        conn.execute("INSERT OR IGNORE INTO elections (id, name, created_at) VALUES (1, 'Election 1', ?)", (created_at,))
+        return
+
+    # The singleton election_state row and the global voted/votes columns become election 1
+    conn.execute("""
+    INSERT OR IGNORE INTO elections (id, name, status, start_time, end_time, results_released, created_at)
+    SELECT 1, 'Election 1', status, start_time, end_time, results_released, ? FROM election_state WHERE id=1
+    """, (created_at,))
+    conn.execute("INSERT OR IGNORE INTO participation SELECT 1, username FROM voters WHERE voted = 1")
+    reset_seq = conn.execute("SELECT reset_seq FROM tally_state WHERE id=1").fetchone()[0]
+    conn.execute("UPDATE ballots SET election_id = 1 WHERE seq > ?", (reset_seq,))
+    # The counters hold election 1's ballots up to applied_seq; later ones are folded in as usual
+    conn.execute("""
+    INSERT INTO tallies (election_id, party_name, shard, votes)
+    SELECT 1, party_name, 0, votes FROM candidates WHERE votes != 0
+    UNION ALL
+    SELECT 1, party_name, shard, votes FROM vote_shards WHERE votes != 0
+    ON CONFLICT (election_id, party_name, shard) DO UPDATE SET votes = votes + excluded.votes
+    """)
+    conn.execute("DROP TABLE election_state")
+    conn.execute("DROP TABLE vote_shards")
+    conn.execute("DROP INDEX IF EXISTS idx_voters_voted")
+    conn.execute("ALTER TABLE voters DROP COLUMN voted")
+    conn.execute("ALTER TABLE candidates DROP COLUMN votes")
+
+def _create_station_sync(conn):
+    # Ballots merged from another station keep that station's id and their seq there.
+    # The pair is unique, so merging the same delta twice adds nothing. Local ballots have no station.
+    columns = _column_names(conn, "ballots")
+    if "station" not in columns:
+        conn.execute("ALTER TABLE ballots ADD COLUMN station TEXT")
+    if "station_seq" not in columns:
+        conn.execute("ALTER TABLE ballots ADD COLUMN station_seq INTEGER")
+    conn.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ballots_station ON ballots (station, station_seq)
+    WHERE station IS NOT NULL""")
+    # This database's own station id and the last local ballot it has exported
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        station_id TEXT,
+        exported_seq INTEGER DEFAULT 0
+    )""")
+    conn.execute("INSERT OR IGNORE INTO sync_state (id, exported_seq) VALUES (1, 0)")
+    # Stations merged into this database, with running totals
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_stations (
+        station TEXT PRIMARY KEY,
+        merged_seq INTEGER DEFAULT 0,
+        ballots INTEGER DEFAULT 0,
+        conflicts INTEGER DEFAULT 0,
+        merged_at TEXT
+    )""")
+    # Ballots from voters who had already voted in the election at another station
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_conflicts (
+        station TEXT,
+        station_seq INTEGER,
+        election_id INTEGER,
+        username TEXT,
+        party_name TEXT,
+        cast_at TEXT,
+        PRIMARY KEY (station, station_seq)
+    )""")
+
+def _chain_ballots(conn):
+    # Hash chain over the ledger (see ballot_chain.py); existing ballots are chained in seq order
+    if "chain_hash" not in _column_names(conn, "ballots"):
+        conn.execute("ALTER TABLE ballots ADD COLUMN chain_hash BLOB")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chain_checkpoints (
+        seq INTEGER PRIMARY KEY, -- last ballot covered
+        first_seq INTEGER,
+        entries INTEGER,
+        chain_hash BLOB,
+        merkle_root BLOB,
+        created_at TEXT
+    )""")
+    ballot_chain.chain_pending(conn)
+    ballot_chain.create_checkpoints(conn)
+
+def _count_voter_changes(conn):
+    # Bumped whenever the roll changes (including birth year edits), so caches built from it know when to rebuild
+    if "changes" not in _column_names(conn, "voter_stats"):
+        conn.execute("ALTER TABLE voter_stats ADD COLUMN changes INTEGER DEFAULT 0")
+    for event in ("INSERT", "DELETE", "UPDATE OF username, birth_year"):
+        name = "voters_changed_" + event.split()[0].lower()
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON voters
+        BEGIN
+            UPDATE voter_stats SET changes = changes + 1 WHERE id = 1;
+        END""")
+
+def _create_party_renames(conn):
+    # Ballots keep the party name they were cast for, while tallies follow renames and drop a
+    # deleted candidate's votes. Each change is logged here so the ledger can still be matched
+    # against the tallies (see ballot_chain.resolve_counts).
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS party_renames (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        election_id INTEGER,
+        seq INTEGER, -- ledger head when the change was made; earlier ballots were cast under old_name
+        old_name TEXT,
+        new_name TEXT, -- NULL when the candidate was deleted
+        changed_at TEXT
+    )""")
+
+def _add_election_uids(conn):
+    # A random id per election that other databases can refer to: station deltas name elections
+    # by it, so two elections that merely share a name are never merged into one
+    if "uid" not in _column_names(conn, "elections"):
+        conn.execute("ALTER TABLE elections ADD COLUMN uid TEXT")
+    conn.execute("UPDATE elections SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_elections_uid ON elections (uid)")
+
+def _count_candidate_changes(conn):
+    # Bumped whenever a candidate is added, removed or edited, so result pollers know to re-read
+    # even when no ballot was cast
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS candidate_stats (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        changes INTEGER DEFAULT 0
+    )""")
+    conn.execute("INSERT OR IGNORE INTO candidate_stats (id, changes) VALUES (1, 0)")
+    for event in ("INSERT", "DELETE", "UPDATE OF party_name, leader_name"):
+        name = "candidates_changed_" + event.split()[0].lower()
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON candidates
+        BEGIN
+            UPDATE candidate_stats SET changes = changes + 1 WHERE id = 1;
+        END""")
+
+
+# (version, description, function). Append new migrations at the end; never edit applied ones.
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "sharded vote counters", _create_vote_shards),
+    (3, "ballot ledger", _create_ballot_ledger),
+    (4, "voter lookup indexes", _create_lookup_indexes),
+    (5, "registered voter count", _create_voter_count),
+    (6, "per-election participation and tallies", _create_elections),
+    (7, "station sync", _create_station_sync),
+    (8, "ballot hash chain", _chain_ballots),
+    (9, "voter change counter", _count_voter_changes),
+    (10, "party renames", _create_party_renames),
+    (11, "election uids", _add_election_uids),
+    (12, "candidate change counter", _count_candidate_changes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, log=None):
+    """
+    Applies all pending migrations. Returns the list of (version, description, seconds) applied.
+    log, if given, is called with a line per migration applied (the CLI passes print).
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock in case another process migrated first
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            started = time.perf_counter()
+            apply(conn)
+            elapsed = time.perf_counter() - started
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT,
+                seconds REAL
+            )""")
+            conn.execute("INSERT OR REPLACE INTO schema_migrations VALUES (?, ?, ?, ?)",
+                         (version, description, datetime.datetime.now().isoformat(sep=" ", timespec="seconds"), elapsed))
+            conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        applied.append((version, description, elapsed))
+        if log:
+            log(f"Applied schema migration {version} ({description}) in {elapsed:.3f}s")
+    return applied
+
+
+# --- Optional storage changes ---
+def convert_to_without_rowid(conn, table, log=None):
+    """
+    Rebuilds a table keyed by a TEXT primary key as WITHOUT ROWID, so lookups by
+    that key go straight to the row instead of through a separate index.
+    Rewrites the whole table, so it is opt-in rather than a startup migration.
+    Returns False if the table already is WITHOUT ROWID.
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    if sql is None:
+        raise ValueError(f"No such table: {table}")
+    sql = sql[0]
+    if sql.rstrip().upper().endswith("WITHOUT ROWID"):
+        return False
+
+    # Indexes and triggers go with the dropped table, so both are recreated on the new one
+    dependent_sql = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name=? AND sql IS NOT NULL", (table,))]
+    new_table = f"{table}_without_rowid"
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # The stored name may be quoted if the table was renamed before
+        create_new = re.sub(rf'^CREATE TABLE\s+("?){table}\1', f"CREATE TABLE {new_table}", sql, count=1)
+        conn.execute(create_new + " WITHOUT ROWID")
+        conn.execute(f"INSERT INTO {new_table} SELECT * FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for statement in dependent_sql:
+            conn.execute(statement)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    if log:
+        log(f"Converted {table} to WITHOUT ROWID in {time.perf_counter() - started:.3f}s")
+    return True
+
+def hash_plaintext_passwords(conn, log=None):
+    """
+    Hashes every password still stored in plaintext. Rows are read a batch at a
+    time in key order and each batch is committed on its own, hashed before the
+    write lock is taken, so the app keeps running while a large roll is upgraded.
+    Returns the number of passwords hashed.
+    """
+    started = time.perf_counter()
+    total = 0
+    for table, key_column in _PASSWORD_TABLES:
+        after = ""
+        while True:
+            rows = conn.execute(f"SELECT {key_column}, password FROM {table} WHERE {key_column} > ? ORDER BY {key_column} LIMIT ?",
+                                (after, _HASH_BATCH)).fetchall()
+            if not rows:
+                break
+            after = rows[-1][0]
+            batch = [(key, password) for key, password in rows if password is not None and not passwords.is_hashed(password)]
+            if not batch:
+                continue
+            hashed = passwords.hash_passwords([password for _, password in batch])
+            with conn:
+                # Skip rows whose password changed (or was upgraded at login) since they were read
+                conn.executemany(f"UPDATE {table} SET password=? WHERE {key_column}=? AND password=?",
+                                 [(stored, key, password) for stored, (key, password) in zip(hashed, batch)])
+            total += len(batch)
+    if log:
+        log(f"Hashed {total} plaintext passwords in {time.perf_counter() - started:.3f}s")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to a voting database.")
+    parser.add_argument("--db", default="voting.db", help="path to the voting database")
+    parser.add_argument("--without-rowid", action="store_true",
+                        help="also rebuild admin, voters and candidates as WITHOUT ROWID tables")
+    parser.add_argument("--hash-passwords", action="store_true",
+                        help="hash passwords still stored in plaintext, in batches, while the app keeps running")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if not migrate(conn, log=print):
+            print(f"Schema is up to date (version {schema_version(conn)}).")
+        if args.without_rowid:
+            for table in ("admin", "voters", "candidates"):
+                convert_to_without_rowid(conn, table, log=print)
+        if args.hash_passwords:
+            hash_plaintext_passwords(conn, log=print)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
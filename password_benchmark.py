@@ -0,0 +1,81 @@
+"""
+Login throughput at each password hashing cost.
+
+For every cost setting, times password verification on one core (the KDF run
+inline) and across the passwords worker pool, and reports logins per second
+per core and in total. A final line shows the rate for repeat logins that are
+answered from the verification cache.
+
+Run with: python password_benchmark.py --costs 12 13 14 15 --logins 64
+"""
+import argparse
+import json
+import os
+import time
+
+import passwords
+
+
+def inline_rate(cost, logins):
+    """Verifications per second on the calling thread, i.e. on a single core."""
+    stored = passwords.hash_password("benchmark", cost)
+    cost, r, p, salt, _ = passwords._decode(stored)
+    started = time.perf_counter()
+    for _ in range(logins):
+        passwords.derive("benchmark", salt, cost, r, p)
+    return logins / (time.perf_counter() - started)
+
+
+def pool_rate(cost, logins):
+    """Verifications per second across all worker threads. Each one is a full KDF run, like a cache miss."""
+    passwords.hash_passwords(["warm-up"] * passwords.HASH_WORKERS, cost) # Start the workers outside the timing
+    started = time.perf_counter()
+    passwords.hash_passwords(["benchmark"] * logins, cost)
+    return logins / (time.perf_counter() - started)
+
+
+def cached_rate(logins):
+    """Repeat logins for the same account, answered from the verification cache."""
+    stored = passwords.hash_password("benchmark")
+    passwords.verify_password("benchmark", stored)
+    started = time.perf_counter()
+    for _ in range(logins):
+        passwords.verify_password("benchmark", stored)
+    return logins / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logins per second at each password hashing cost.")
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15, 16],
+                        help="log2 of the scrypt N parameter to measure")
+    parser.add_argument("--logins", type=int, default=64, help="verifications timed per cost setting")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    workers = passwords.HASH_WORKERS
+    results = []
+    try:
+        for cost in args.costs:
+            per_core = inline_rate(cost, args.logins)
+            total = pool_rate(cost, args.logins) if workers > 0 else per_core
+            results.append({"cost": cost, "memory_mb": 128 * passwords.BLOCK_SIZE * 2 ** cost / 2 ** 20,
+                            "logins_per_s_per_core": per_core, "logins_per_s_total": total})
+        cached = cached_rate(args.logins * 100)
+    finally:
+        passwords.shutdown()
+
+    if args.json:
+        print(json.dumps({"workers": workers, "cores": os.cpu_count(), "results": results,
+                          "cached_logins_per_s": cached}, indent=2))
+        return
+
+    print(f"{workers} hashing workers on {os.cpu_count()} cores (default cost {passwords.COST})")
+    print(f"{'cost':>4} {'memory':>8} {'per core':>12} {'total':>12}")
+    for row in results:
+        print(f"{row['cost']:>4} {row['memory_mb']:>6.0f}MB {row['logins_per_s_per_core']:>10.1f}/s "
+              f"{row['logins_per_s_total']:>10.1f}/s")
+    print(f"Repeat logins answered from the verification cache: {cached:,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Salted password hashing for admin, voter and candidate passwords.
+
+Passwords are stored as "scrypt$<cost>$<r>$<p>$<salt hex>$<hash hex>", where
+cost is log2 of scrypt's N. The cost used for new hashes comes from COST
+(override with the VOTING_HASH_COST environment variable); stored hashes keep
+their own parameters, so raising the cost only affects passwords hashed from
+then on, and needs_rehash() tells callers which ones to upgrade at login.
+
+The key derivation runs on a pool of worker threads (VOTING_HASH_WORKERS,
+default one per core, 0 to hash in the calling thread); hashlib.scrypt releases
+the GIL, so the threads hash in parallel, and a burst of logins does not stall
+the Tk thread or the server's request threads. Threads rather than processes,
+because the GUI and the server are multithreaded and forking them is unsafe. Successful
+verifications are remembered in a small in-memory cache, keyed by the stored
+hash and a keyed digest of the password, so repeat logins skip the KDF.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = "scrypt"
+DEFAULT_COST = 14 # N = 2**14: about 16 MB and tens of milliseconds per hash
+COST = int(os.environ.get("VOTING_HASH_COST", DEFAULT_COST))
+BLOCK_SIZE = 8    # scrypt r
+PARALLELISM = 1   # scrypt p
+SALT_BYTES = 16
+HASH_WORKERS = int(os.environ.get("VOTING_HASH_WORKERS", os.cpu_count() or 1))
+VERIFY_CACHE_SIZE = 10000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_cache_key = secrets.token_bytes(32) # Per process, so cached digests are useless outside it
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+# --- Key derivation ---
+def derive(password, salt, cost, r, p):
+    """Runs scrypt."""
+    n = 2 ** cost
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=2 * 128 * r * (n + p), dklen=32)
+
+def _pool():
+    """Returns the thread pool, starting it on first use, or None when hashing runs inline."""
+    global _executor
+    with _executor_lock:
+        if _executor is None and HASH_WORKERS > 0:
+            _executor = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="scrypt")
+        return _executor
+
+def _derive_all(jobs):
+    """Derives keys for a list of (password, salt, cost, r, p) jobs, spread over the pool."""
+    pool = _pool()
+    if pool is None or len(jobs) == 0:
+        return [derive(*job) for job in jobs]
+    return list(pool.map(derive, *zip(*jobs)))
+
+def shutdown():
+    """Stops the worker threads. They are started again on the next hash."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+# --- Hashing and verification ---
+def _encode(cost, r, p, salt, key):
+    return f"{SCHEME}${cost}${r}${p}${salt.hex()}${key.hex()}"
+
+def _decode(stored):
+    """Returns (cost, r, p, salt, key) for a stored hash, or None if it is not one of ours."""
+    parts = stored.split("$") if isinstance(stored, str) else []
+    if len(parts) != 6 or parts[0] != SCHEME:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), bytes.fromhex(parts[4]), bytes.fromhex(parts[5])
+    except ValueError:
+        return None
+
+def is_hashed(stored):
+    """True if stored is a password hash rather than a legacy plaintext password."""
+    return _decode(stored) is not None
+
+def hash_passwords(passwords, cost=None):
+    """Hashes many passwords at once, spread over the worker processes. Returns the stored forms in order."""
+    cost = COST if cost is None else cost
+    jobs = [(password, secrets.token_bytes(SALT_BYTES), cost, BLOCK_SIZE, PARALLELISM) for password in passwords]
+    return [_encode(cost, r, p, salt, key) for (_, salt, cost, r, p), key in zip(jobs, _derive_all(jobs))]
+
+def hash_password(password, cost=None):
+    """Returns the stored form of password with a fresh salt."""
+    return hash_passwords([password], cost)[0]
+
+def _cache_digest(password):
+    return hmac.new(_cache_key, password.encode("utf-8"), hashlib.sha256).digest()
+
+def verify_password(password, stored):
+    """Checks password against a stored hash. Never raises for malformed or missing hashes."""
+    decoded = _decode(stored)
+    if decoded is None or password is None:
+        return False
+    digest = _cache_digest(password)
+    with _verified_lock:
+        cached = _verified.get(stored)
+        if cached is not None:
+            _verified.move_to_end(stored)
+    if cached is not None and hmac.compare_digest(cached, digest):
+        return True
+
+    cost, r, p, salt, key = decoded
+    if not hmac.compare_digest(_derive_all([(password, salt, cost, r, p)])[0], key):
+        return False
+    with _verified_lock:
+        _verified[stored] = digest
+        if len(_verified) > VERIFY_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return True
+
+def burn_verification():
+    """Spends the same effort as a real verification, so unknown usernames take as long as wrong passwords."""
+    _derive_all([("", b"\0" * SALT_BYTES, COST, BLOCK_SIZE, PARALLELISM)])
+
+def needs_rehash(stored):
+    """True if stored was hashed with different parameters than new hashes would use."""
+    decoded = _decode(stored)
+    return decoded is None or decoded[:3] != (COST, BLOCK_SIZE, PARALLELISM)
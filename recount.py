@@ -0,0 +1,243 @@
+"""
+Parallel, cross-checked recount of an election from the ballot ledger.
+
+The ledger is split into seq ranges, each counted by a worker process with
+its own read-only connection, and the partial counts are added up. The result
+is checked against what the rest of the database claims:
+    - the per-party totals in tallies (what results and the live dashboard show),
+    - the number of voters recorded as having voted (participation),
+    - which voters those are: every worker also sums a 64-bit hash of each
+      ballot's username, and the participation rows, split into username
+      ranges, are summed the same way. The two sums only match when every
+      participating voter has exactly one ballot, so a double vote or a lost
+      ballot shows up without sorting or shipping millions of usernames.
+When something does not match, the offending voters are looked up with
+ordinary queries, which only runs on that failure path.
+
+Recount a closed election: ballots cast while the recount runs can show up as
+discrepancies.
+
+Run with: python recount.py --db voting.db --election 3 --workers 8
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ballot_chain
+import voting_engine
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+PARTITIONS_PER_WORKER = 4 # More ranges than workers, so one slow range doesn't hold up the rest
+SAMPLES_PER_PARTITION = 16 # Ballots sampled per participation range when picking username boundaries
+EXAMPLES_SHOWN = 10 # Offending voters listed per discrepancy
+_DIGEST_MASK = 2 ** 64 - 1
+
+
+def username_digest(username):
+    """64-bit hash of a username. Summing it over rows gives an order-independent fingerprint of the set."""
+    return int.from_bytes(hashlib.blake2b(username.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# --- Workers. Module level so they can run in the process pool ---
+def _open(path):
+    import sqlite3
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=voting_engine.BUSY_TIMEOUT)
+
+def count_ballots(path, election_id, low_seq, high_seq, rename_seqs=()):
+    """
+    Counts an election's ballots with low_seq <= seq <= high_seq. Returns
+    ({(party, rename epoch): votes}, ballots, digest); see ballot_chain.resolve_counts.
+    """
+    conn = _open(path)
+    try:
+        counts = {}
+        digest = 0
+        for seq, username, party_name in conn.execute(
+                "SELECT seq, username, party_name FROM ballots WHERE seq BETWEEN ? AND ? AND election_id=?",
+                (low_seq, high_seq, election_id)):
+            key = (party_name, ballot_chain.rename_epoch(rename_seqs, seq))
+            counts[key] = counts.get(key, 0) + 1
+            digest += username_digest(username)
+        return counts, sum(counts.values()), digest & _DIGEST_MASK
+    finally:
+        conn.close()
+
+def count_participation(path, election_id, low_user, high_user):
+    """Counts an election's participation rows with low_user <= username < high_user (None: unbounded). Returns (rows, digest)."""
+    conn = _open(path)
+    try:
+        rows = digest = 0
+        for (username,) in conn.execute("""
+                SELECT username FROM participation
+                WHERE election_id=? AND username >= COALESCE(?, '') AND (? IS NULL OR username < ?)
+                """, (election_id, low_user, high_user, high_user)):
+            rows += 1
+            digest += username_digest(username)
+        return rows, digest & _DIGEST_MASK
+    finally:
+        conn.close()
+
+
+# --- Partitioning ---
+def seq_ranges(low, high, parts):
+    """Splits low..high (inclusive) into at most parts contiguous (first, last) ranges."""
+    if low is None:
+        return []
+    size = max(1, -(-(high - low + 1) // parts))
+    return [(start, min(start + size - 1, high)) for start in range(low, high + 1, size)]
+
+def username_ranges(conn, low_seq, high_seq, parts):
+    """
+    Splits the username space into about parts [low, high) ranges, with boundaries
+    taken from ballots sampled by seq (cheap primary-key lookups), so the ranges hold
+    roughly equal numbers of voters.
+    """
+    if low_seq is None or parts <= 1:
+        return [(None, None)]
+    rng = random.Random(high_seq)
+    sample = set()
+    for _ in range(parts * SAMPLES_PER_PARTITION):
+        row = conn.execute("SELECT username FROM ballots WHERE seq >= ? ORDER BY seq LIMIT 1",
+                           (rng.randint(low_seq, high_seq),)).fetchone()
+        if row:
+            sample.add(row[0])
+    sample = sorted(sample)
+    bounds = sorted({sample[len(sample) * i // parts] for i in range(1, parts)}) if sample else []
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+# --- Recount ---
+def database_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def recount(conn, election_id=None, workers=DEFAULT_WORKERS, partitions=None):
+    """
+    Recounts an election (by default the current one) across workers processes
+    (0 counts on this process) and cross-checks the result. Returns a report dict;
+    report["discrepancies"] is empty when everything agrees.
+    """
+    started = time.perf_counter()
+    if election_id is None:
+        election_id = voting_engine.current_election(conn)
+    voting_engine.refresh_tally(conn)
+    path = database_path(conn)
+    partitions = partitions or max(1, workers) * PARTITIONS_PER_WORKER
+    low_seq, high_seq = conn.execute("SELECT MIN(seq), MAX(seq) FROM ballots").fetchone()
+    renames = ballot_chain.load_renames(conn).get(election_id, [])
+    rename_seqs = [rename[0] for rename in renames]
+    ballot_jobs = [(path, election_id, low, high, rename_seqs) for low, high in seq_ranges(low_seq, high_seq, partitions)]
+    voter_jobs = [(path, election_id, low, high) for low, high in username_ranges(conn, low_seq, high_seq, partitions)]
+
+    if workers > 0:
+        # spawn, not fork: the GUI and the server call this from a multithreaded process
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            ballot_futures = [pool.submit(count_ballots, *job) for job in ballot_jobs]
+            voter_futures = [pool.submit(count_participation, *job) for job in voter_jobs]
+            ballot_parts = [f.result() for f in ballot_futures]
+            voter_parts = [f.result() for f in voter_futures]
+    else:
+        ballot_parts = [count_ballots(*job) for job in ballot_jobs]
+        voter_parts = [count_participation(*job) for job in voter_jobs]
+
+    epoch_counts = {}
+    for part_counts, _, _ in ballot_parts:
+        for key, votes in part_counts.items():
+            epoch_counts[key] = epoch_counts.get(key, 0) + votes
+    # Under the names the tallies use now; ballots for deleted candidates drop out
+    counts = ballot_chain.resolve_counts(epoch_counts, renames)
+    ballots = sum(part[1] for part in ballot_parts)
+    ballot_digest = sum(part[2] for part in ballot_parts) & _DIGEST_MASK
+    voted = sum(part[0] for part in voter_parts)
+    voter_digest = sum(part[1] for part in voter_parts) & _DIGEST_MASK
+
+    discrepancies = _cross_check(conn, election_id, counts, ballots, voted, ballot_digest == voter_digest)
+    return {
+        "election_id": election_id,
+        "ballots": ballots,
+        "voted": voted,
+        "results": dict(sorted(counts.items(), key=lambda item: -item[1])),
+        "discrepancies": discrepancies,
+        "workers": workers,
+        "partitions": len(ballot_jobs),
+        "seconds": time.perf_counter() - started,
+    }
+
+def _cross_check(conn, election_id, counts, ballots, voted, voters_match):
+    """
+    Compares a recount (renames and deletions already applied) with the stored tallies
+    and participation. Every party counts, so votes in tallies that no ballot accounts
+    for are a discrepancy. Returns a list of messages.
+    """
+    problems = []
+    stored = dict(conn.execute("""
+        SELECT party_name, SUM(votes) FROM tallies WHERE election_id=? GROUP BY party_name HAVING SUM(votes) != 0
+    """, (election_id,)).fetchall())
+    ballot_chain.compare_tallies(stored, counts, problems, f"Election {election_id}, ")
+    if ballots != voted:
+        problems.append(f"{ballots} ballots but {voted} voters recorded as having voted.")
+    if not voters_match:
+        problems.extend(_voter_mismatches(conn, election_id))
+    return problems
+
+def _voter_mismatches(conn, election_id):
+    """Finds the voters behind a digest mismatch. Full scans, so only run when the digests differ."""
+    problems = []
+    for username, count in conn.execute("""
+            SELECT username, COUNT(*) FROM ballots WHERE election_id=? GROUP BY username HAVING COUNT(*) > 1 LIMIT ?
+            """, (election_id, EXAMPLES_SHOWN)):
+        problems.append(f"{username} has {count} ballots.")
+    # EXCEPT sorts each side once; ballots has no username index for a correlated lookup
+    for (username,) in conn.execute("""
+            SELECT username FROM ballots WHERE election_id=?
+            EXCEPT SELECT username FROM participation WHERE election_id=? LIMIT ?
+            """, (election_id, election_id, EXAMPLES_SHOWN)):
+        problems.append(f"{username} has a ballot but is not recorded as having voted.")
+    for (username,) in conn.execute("""
+            SELECT username FROM participation WHERE election_id=?
+            EXCEPT SELECT username FROM ballots WHERE election_id=? LIMIT ?
+            """, (election_id, election_id, EXAMPLES_SHOWN)):
+        problems.append(f"{username} is recorded as having voted but has no ballot.")
+    if not problems:
+        problems.append("The voters with ballots differ from the voters recorded as having voted.")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount an election from the ballot ledger and cross-check it.")
+    parser.add_argument("--db", default=voting_engine.DB_PATH, help="path to the voting database")
+    parser.add_argument("--election", type=int, help="election id (default: the current election)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (0 counts inline)")
+    parser.add_argument("--partitions", type=int, help=f"ledger ranges (default: {PARTITIONS_PER_WORKER} per worker)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    conn = voting_engine.connect(args.db, create_schema=False)
+    try:
+        report = recount(conn, args.election, args.workers, args.partitions)
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Election {report['election_id']}: {report['ballots']:,} ballots, {report['voted']:,} voters "
+              f"({report['partitions']} ranges on {report['workers']} workers, {report['seconds']:.2f}s)")
+        for party_name, votes in report["results"].items():
+            print(f"  {party_name}: {votes:,}")
+        if report["discrepancies"]:
+            print("DISCREPANCIES:")
+            for problem in report["discrepancies"]:
+                print(f"  {problem}")
+        else:
+            print("Recount matches the stored tallies and participation.")
+    raise SystemExit(1 if report["discrepancies"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Election reset latency at different roll sizes.
+
+For each roll size, builds a throwaway database with that many voters, half of
+whom have voted in the current election, then times voting_engine.reset_election.
+Resetting starts a fresh election instead of clearing per-voter flags, so its
+latency should stay flat as the roll grows. With --compare, the same database
+also times clearing the current election's participation rows in place (rolled
+back afterwards), which is what a reset that rewrites voter data has to pay.
+
+Run with: python reset_benchmark.py --sizes 10000 1000000 10000000 --compare
+The 10M database needs roughly 1 GB of free disk space.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import ballot_chain
+import voting_engine
+
+PARTIES = ["Alpha", "Beta", "Gamma"]
+
+
+def build_database(path, voters):
+    """Creates a roll of voters; every second voter has a ballot in the current, Active election."""
+    conn = voting_engine.connect(path)
+    for party in PARTIES:
+        voting_engine.add_candidate(conn, party, f"{party} Leader", "pw")
+    election_id = voting_engine.current_election(conn)
+    voting_engine.set_election_status(conn, 'Active')
+    with conn:
+        # Bulk SQL instead of register_voter: hashing millions of passwords is not what is being measured
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+            INSERT INTO voters (username, password, birth_year) SELECT printf('voter%08d', i), 'x', 1980 FROM n
+        """, (voters,))
+        conn.execute("""
+            INSERT INTO participation (election_id, username)
+            SELECT ?, username FROM voters WHERE rowid % 2 = 0
+        """, (election_id,))
+        conn.execute("""
+            INSERT INTO ballots (election_id, username, party_name, cast_at)
+            SELECT election_id, username, 'Alpha', '2024-01-01 00:00:00' FROM participation WHERE election_id = ?
+        """, (election_id,))
+        ballot_chain.chain_pending(conn)
+    voting_engine.refresh_tally(conn)
+    return conn
+
+
+def time_reset(conn, repeats):
+    """Median seconds for reset_election, re-activating and casting one ballot between runs."""
+    samples = []
+    for _ in range(repeats):
+        voting_engine.set_election_status(conn, 'Active')
+        voting_engine.cast_vote(conn, "voter00000000", "Beta")
+        started = time.perf_counter()
+        voting_engine.reset_election(conn)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def time_clear_in_place(conn, election_id):
+    """Seconds to delete an election's participation rows, the work a clear-in-place reset would do."""
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM participation WHERE election_id=?", (election_id,))
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure election reset latency at several roll sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000, 10000000],
+                        help="numbers of registered voters to test")
+    parser.add_argument("--repeats", type=int, default=5, help="resets timed per roll size")
+    parser.add_argument("--compare", action="store_true",
+                        help="also time clearing participation in place (rolled back)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for voters in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "reset.db")
+            started = time.perf_counter()
+            conn = build_database(path, voters)
+            build_seconds = time.perf_counter() - started
+            row = {"voters": voters, "voted": voting_engine.count_voted(conn), "build_s": build_seconds}
+            if args.compare:
+                row["clear_in_place_s"] = time_clear_in_place(conn, voting_engine.current_election(conn))
+            row["reset_s"] = time_reset(conn, args.repeats)
+            row["db_bytes"] = os.path.getsize(path)
+            conn.close()
+        results.append(row)
+        if not args.json:
+            line = f"{voters:>10,} voters ({row['voted']:,} voted): reset {row['reset_s'] * 1000:8.3f} ms"
+            if args.compare:
+                line += f", clear in place {row['clear_in_place_s'] * 1000:10.1f} ms"
+            print(line + f"  (built in {build_seconds:.1f}s, {row['db_bytes'] / 2 ** 20:.0f} MB)")
+
+    if args.json:
+        print(json.dumps({"repeats": args.repeats, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
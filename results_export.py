@@ -0,0 +1,345 @@
+"""
+Streaming export of election results, turnout and the ballot ledger.
+
+Three tables can be exported for an election:
+    tallies  party_name, leader_name, votes, share
+    turnout  cohort_start, cohort_end, registered, voted, turnout (by birth-year cohort)
+    ledger   every ballot: seq, election_id, username, party_name, shard, cast_at,
+             station, station_seq, chain_hash
+Rows are read through a cursor in chunks of chunk_size and each chunk goes to
+every requested format before the next one is fetched, so memory use depends
+on the chunk size and a multi-million-ballot ledger is read from SQLite once.
+All tables come from one read snapshot.
+
+Formats:
+    csv       one header row, then the rows (blobs as hex)
+    columnar  a compact binary file laid out like Arrow/Parquet: one row group per
+              chunk, each column stored as a validity bitmap plus little-endian
+              int64/float64 values, or int64 offsets plus bytes for text and blobs,
+              zlib-compressed per column. A JSON footer holds the schema and the
+              position of every row group, so readers can pick columns and row
+              groups without scanning the file. read_columnar reads it back with
+              the standard library; a NumPy or Arrow reader can map the buffers directly.
+    arrow     an Arrow IPC file, only if pyarrow is installed
+
+Run with: python results_export.py --db voting.db --election 3 --out-dir exports --formats csv columnar
+          python results_export.py --describe exports/election3_ledger.vcol
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+
+import voting_engine
+from voting_engine import VotingError
+
+TABLES = ("tallies", "turnout", "ledger")
+FORMATS = ("csv", "columnar", "arrow")
+EXTENSIONS = {"csv": ".csv", "columnar": ".vcol", "arrow": ".arrow"}
+DEFAULT_CHUNK_SIZE = 50000
+COLUMNAR_MAGIC = b"VCOL1\n\0\0"
+COLUMNAR_VERSION = 1
+_FOOTER_LENGTH = struct.Struct("<Q")
+
+
+# --- Sources: (columns, chunks) per table. Columns are (name, type) with type int, float, text or blob ---
+def iter_chunks(cursor, size):
+    """Yields lists of up to size rows from cursor until it is exhausted."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def tally_table(conn, election_id, chunk_size):
+    rows = conn.execute("""
+        SELECT party_name, (SELECT leader_name FROM candidates c WHERE c.party_name = t.party_name), SUM(votes)
+        FROM tallies t WHERE election_id=? GROUP BY party_name
+        UNION ALL
+        SELECT party_name, leader_name, 0 FROM candidates
+        WHERE ? = (SELECT MAX(id) FROM elections)
+          AND party_name NOT IN (SELECT party_name FROM tallies WHERE election_id=?)
+        ORDER BY 3 DESC, 1
+    """, (election_id, election_id, election_id)).fetchall()
+    total = sum(row[2] for row in rows)
+    rows = [(party, leader, votes, votes / total if total else 0.0) for party, leader, votes in rows]
+    columns = [("party_name", "text"), ("leader_name", "text"), ("votes", "int"), ("share", "float")]
+    return columns, (rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size))
+
+def turnout_table(conn, election_id, chunk_size, cohort_years=1):
+    cursor = conn.execute("""
+        SELECT v.birth_year - v.birth_year % ? AS cohort, COUNT(*), COUNT(p.username)
+        FROM voters v LEFT JOIN participation p ON p.election_id = ? AND p.username = v.username
+        WHERE v.birth_year IS NOT NULL
+        GROUP BY cohort ORDER BY cohort
+    """, (cohort_years, election_id))
+    columns = [("cohort_start", "int"), ("cohort_end", "int"), ("registered", "int"), ("voted", "int"), ("turnout", "float")]
+    chunks = ([(cohort, cohort + cohort_years - 1, registered, voted, voted / registered)
+               for cohort, registered, voted in rows] for rows in iter_chunks(cursor, chunk_size))
+    return columns, chunks
+
+def ledger_table(conn, election_id, chunk_size):
+    cursor = conn.execute("""
+        SELECT seq, election_id, username, party_name, shard, cast_at, station, station_seq, chain_hash
+        FROM ballots WHERE election_id=? ORDER BY seq
+    """, (election_id,))
+    columns = [("seq", "int"), ("election_id", "int"), ("username", "text"), ("party_name", "text"), ("shard", "int"),
+               ("cast_at", "text"), ("station", "text"), ("station_seq", "int"), ("chain_hash", "blob")]
+    return columns, iter_chunks(cursor, chunk_size)
+
+
+# --- Sinks: each takes the chunks of one table ---
+class CsvSink:
+    def __init__(self, path, columns, metadata):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow([name for name, _ in columns])
+        self.blobs = [i for i, (_, kind) in enumerate(columns) if kind == "blob"]
+
+    def write(self, rows):
+        if self.blobs:
+            rows = [[value.hex() if i in self.blobs and value is not None else value for i, value in enumerate(row)]
+                    for row in rows]
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class ColumnarSink:
+    """Writes the columnar format described in the module docstring."""
+
+    def __init__(self, path, columns, metadata, compression_level=1):
+        self.f = open(path, "wb")
+        self.f.write(COLUMNAR_MAGIC)
+        self.columns = columns
+        self.metadata = metadata
+        self.level = compression_level
+        self.row_groups = []
+        self.rows = 0
+
+    def write(self, rows):
+        group = {"offset": self.f.tell(), "rows": len(rows), "columns": []}
+        for index, (_, kind) in enumerate(self.columns):
+            buffers = encode_column([row[index] for row in rows], kind)
+            data = zlib.compress(b"".join(buffers), self.level)
+            self.f.write(data)
+            group["columns"].append({"length": len(data), "buffers": [len(b) for b in buffers]})
+        self.row_groups.append(group)
+        self.rows += len(rows)
+
+    def close(self):
+        footer = json.dumps({"version": COLUMNAR_VERSION, "columns": self.columns, "compression": "zlib",
+                             "rows": self.rows, "row_groups": self.row_groups, "metadata": self.metadata}).encode("utf-8")
+        self.f.write(footer)
+        self.f.write(_FOOTER_LENGTH.pack(len(footer)))
+        self.f.write(COLUMNAR_MAGIC)
+        self.f.close()
+
+class ArrowSink:
+    """Arrow IPC file writer. pyarrow is optional and only imported when this format is asked for."""
+
+    def __init__(self, path, columns, metadata):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise VotingError("Arrow export needs pyarrow (pip install pyarrow).")
+        types = {"int": pyarrow.int64(), "float": pyarrow.float64(), "text": pyarrow.string(), "blob": pyarrow.binary()}
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns],
+                                     metadata={key: str(value) for key, value in metadata.items()})
+        self.sink = pyarrow.OSFile(path, "wb")
+        self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+    def write(self, rows):
+        arrays = [self.pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+        self.writer.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+SINKS = {"csv": CsvSink, "columnar": ColumnarSink, "arrow": ArrowSink}
+
+
+# --- Columnar encoding ---
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _validity(values):
+    """Bitmap with bit i set when values[i] is not None, least significant bit first like Arrow."""
+    count = len(values)
+    if None not in values: # The common case, checked at C speed
+        validity = bytearray(b"\xff" * (count // 8))
+        if count % 8:
+            validity.append((1 << count % 8) - 1)
+        return validity
+    validity = bytearray((count + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            validity[i >> 3] |= 1 << (i & 7)
+    return validity
+
+def encode_column(values, kind):
+    """Encodes one column chunk as [validity bitmap, values] (int, float) or [validity, offsets, data] (text, blob)."""
+    validity = _validity(values)
+    if kind in ("int", "float"):
+        typecode = "q" if kind == "int" else "d"
+        return [bytes(validity), _little_endian(array(typecode, (0 if v is None else v for v in values)))]
+    encoded = [b"" if v is None else (v.encode("utf-8") if kind == "text" else bytes(v)) for v in values]
+    offsets = array("q", accumulate(map(len, encoded), initial=0))
+    return [bytes(validity), _little_endian(offsets), b"".join(encoded)]
+
+def decode_column(buffers, kind, rows):
+    """Inverse of encode_column. Returns a list with None for null values."""
+    validity = buffers[0]
+    present = [validity[i >> 3] >> (i & 7) & 1 for i in range(rows)]
+    if kind in ("int", "float"):
+        values = array("q" if kind == "int" else "d")
+        values.frombytes(buffers[1])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return [value if ok else None for value, ok in zip(values, present)]
+    offsets = array("q")
+    offsets.frombytes(buffers[1])
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    data = buffers[2]
+    items = [data[offsets[i]:offsets[i + 1]] for i in range(rows)]
+    if kind == "text":
+        items = [item.decode("utf-8") for item in items]
+    return [item if ok else None for item, ok in zip(items, present)]
+
+def read_columnar_footer(f):
+    """Returns the footer dict of an open columnar file."""
+    f.seek(-(_FOOTER_LENGTH.size + len(COLUMNAR_MAGIC)), os.SEEK_END)
+    length = _FOOTER_LENGTH.unpack(f.read(_FOOTER_LENGTH.size))[0]
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise VotingError("Not a columnar export file.")
+    f.seek(-(_FOOTER_LENGTH.size + len(COLUMNAR_MAGIC) + length), os.SEEK_END)
+    return json.loads(f.read(length))
+
+def read_columnar(path, columns=None):
+    """Yields each row group of a columnar file as {column name: list of values}, optionally only some columns."""
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise VotingError("Not a columnar export file.")
+        footer = read_columnar_footer(f)
+        schema = footer["columns"]
+        for group in footer["row_groups"]:
+            position = group["offset"]
+            values = {}
+            for (name, kind), column in zip(schema, group["columns"]):
+                if columns is None or name in columns:
+                    f.seek(position)
+                    data = zlib.decompress(f.read(column["length"]))
+                    buffers, start = [], 0
+                    for size in column["buffers"]:
+                        buffers.append(data[start:start + size])
+                        start += size
+                    values[name] = decode_column(buffers, kind, group["rows"])
+                position += column["length"]
+            yield values
+
+
+# --- Export ---
+def export_results(conn, out_dir, election_id=None, formats=("csv", "columnar"), tables=TABLES,
+                   chunk_size=DEFAULT_CHUNK_SIZE, cohort_years=1):
+    """
+    Exports tables of an election (default: the current one) in formats into out_dir.
+    Returns {table: {"rows": n, "files": [paths]}}.
+    """
+    if election_id is None:
+        election_id = voting_engine.current_election(conn)
+    if conn.execute("SELECT 1 FROM elections WHERE id=?", (election_id,)).fetchone() is None:
+        raise VotingError(f"Unknown election: {election_id}")
+    if cohort_years < 1:
+        raise VotingError("Cohorts must span at least one year.")
+    os.makedirs(out_dir, exist_ok=True)
+    voting_engine.refresh_tally(conn)
+    sources = {
+        "tallies": lambda: tally_table(conn, election_id, chunk_size),
+        "turnout": lambda: turnout_table(conn, election_id, chunk_size, cohort_years),
+        "ledger": lambda: ledger_table(conn, election_id, chunk_size),
+    }
+    summary = {}
+    conn.execute("BEGIN") # One snapshot for all tables
+    try:
+        for table in tables:
+            columns, chunks = sources[table]()
+            metadata = {"table": table, "election_id": election_id, "cohort_years": cohort_years}
+            paths = [os.path.join(out_dir, f"election{election_id}_{table}{EXTENSIONS[fmt]}") for fmt in formats]
+            summary[table] = {"rows": _write_table(columns, chunks, formats, paths, metadata), "files": paths}
+    finally:
+        conn.commit()
+    return summary
+
+def _write_table(columns, chunks, formats, paths, metadata):
+    """Streams chunks into one sink per format, writing to temporary files renamed once complete."""
+    sinks = []
+    try:
+        for fmt, path in zip(formats, paths):
+            sinks.append(SINKS[fmt](path + ".tmp", columns, metadata))
+        rows = 0
+        for chunk in chunks:
+            for sink in sinks:
+                sink.write(chunk)
+            rows += len(chunk)
+    except BaseException:
+        for sink in sinks:
+            sink.close()
+        for path in paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+    for sink, path in zip(sinks, paths):
+        sink.close()
+        os.replace(path + ".tmp", path)
+    return rows
+
+
+def describe(path):
+    """Schema, row count and row groups of a columnar file."""
+    with open(path, "rb") as f:
+        footer = read_columnar_footer(f)
+    return {"columns": footer["columns"], "rows": footer["rows"], "row_groups": len(footer["row_groups"]),
+            "metadata": footer["metadata"], "bytes": os.path.getsize(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export election results, turnout and the ballot ledger.")
+    parser.add_argument("--db", default=voting_engine.DB_PATH, help="path to the voting database")
+    parser.add_argument("--election", type=int, help="election id (default: the current election)")
+    parser.add_argument("--out-dir", default=".", help="directory for the exported files")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["csv", "columnar"])
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=list(TABLES))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk / row group")
+    parser.add_argument("--cohort-years", type=int, default=1, help="birth years per turnout cohort")
+    parser.add_argument("--describe", metavar="FILE", help="print the schema of a columnar file and exit")
+    args = parser.parse_args()
+
+    try:
+        if args.describe:
+            print(json.dumps(describe(args.describe), indent=2))
+            return
+        conn = voting_engine.connect(args.db, create_schema=False)
+        try:
+            summary = export_results(conn, args.out_dir, args.election, args.formats, args.tables,
+                                     args.chunk_size, args.cohort_years)
+        finally:
+            conn.close()
+    except VotingError as e:
+        parser.exit(1, f"Error: {e}\n")
+    for table, result in summary.items():
+        print(f"{table}: {result['rows']:,} rows -> {', '.join(result['files'])}")
+
+
+if __name__ == "__main__":
+    main()
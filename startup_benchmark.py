@@ -0,0 +1,124 @@
+"""
+Startup-time benchmark for the kiosk GUI.
+
+Launches vm_1.py several times with the startup probe enabled (the app prints a
+marker once its first window is visible and exits) and reports time-to-first-window.
+One extra run under `python -X importtime` lists the imports that cost the most
+during startup, and the deferred matplotlib load is timed on its own so its cost
+stays visible even though it no longer happens before the first window.
+
+Each run uses a fresh temporary directory, so the real voting.db is never touched.
+
+Run with: python startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vm_1.py")
+# Kept in sync with vm_1.STARTUP_PROBE_ENV / STARTUP_PROBE_MARKER; not imported, so the benchmark does not load Tk itself
+PROBE_ENV = "VOTING_STARTUP_PROBE"
+PROBE_MARKER = "first-window-visible"
+MATPLOTLIB_LOAD = ("import matplotlib; matplotlib.use('TkAgg'); "
+                   "from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk; "
+                   "from matplotlib.figure import Figure")
+
+
+def time_to_first_window(extra_args=(), timeout=60):
+    """Starts the app once and returns (seconds until the first window was visible, stderr output)."""
+    env = dict(os.environ, **{PROBE_ENV: "1"})
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryFile("w+") as errors:
+        started = time.perf_counter()
+        # stderr goes to a file: -X importtime output can fill a pipe while stdout is being read
+        proc = subprocess.Popen([sys.executable, *extra_args, APP], cwd=tmp, env=env, text=True,
+                                stdout=subprocess.PIPE, stderr=errors)
+        elapsed = None
+        for line in proc.stdout:
+            if line.strip() == PROBE_MARKER:
+                elapsed = time.perf_counter() - started
+        proc.wait(timeout=timeout)
+        errors.seek(0)
+        stderr = errors.read()
+    if elapsed is None:
+        raise RuntimeError(f"vm_1.py exited with status {proc.returncode} before showing a window:\n{stderr}")
+    return elapsed, stderr
+
+
+def parse_importtime(stderr):
+    """Returns (cumulative_us, self_us, module) for every line of `-X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        entries.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return entries
+
+
+def top_level_imports(entries, count):
+    """The most expensive imports made directly by the app (no indentation in the importtime tree)."""
+    direct = [(cumulative, module.strip()) for cumulative, _, module in entries if not module.startswith("  ")]
+    return sorted(direct, reverse=True)[:count]
+
+
+def _top_level_import_us(code):
+    """Total cumulative import time, in microseconds, of running code in a fresh interpreter, or None if it fails."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return sum(cumulative for cumulative, _, module in parse_importtime(result.stderr) if not module.startswith("  "))
+
+
+def matplotlib_load_seconds():
+    """Cost of the lazy matplotlib load, or None if matplotlib is not installed."""
+    loaded = _top_level_import_us(MATPLOTLIB_LOAD)
+    if loaded is None:
+        return None
+    # Subtract the imports every interpreter makes at startup
+    return max(loaded - _top_level_import_us("pass"), 0) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the voting GUI's time to first window.")
+    parser.add_argument("--runs", type=int, default=5, help="timed launches of the app")
+    parser.add_argument("--top", type=int, default=10, help="number of imports to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # The first launch warms the OS file cache and is not counted
+    time_to_first_window()
+    samples = [time_to_first_window()[0] for _ in range(args.runs)]
+    _, stderr = time_to_first_window(["-X", "importtime"])
+    imports = top_level_imports(parse_importtime(stderr), args.top)
+    deferred = matplotlib_load_seconds()
+
+    report = {
+        "runs": args.runs,
+        "first_window_median_s": statistics.median(samples),
+        "first_window_min_s": min(samples),
+        "first_window_max_s": max(samples),
+        "deferred_matplotlib_load_s": deferred,
+        "top_imports": [{"module": module, "cumulative_ms": cumulative / 1000} for cumulative, module in imports],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Time to first window over {args.runs} runs: median {report['first_window_median_s'] * 1000:.0f} ms "
+          f"(min {report['first_window_min_s'] * 1000:.0f} ms, max {report['first_window_max_s'] * 1000:.0f} ms)")
+    if deferred is None:
+        print("Deferred matplotlib load: matplotlib is not installed")
+    else:
+        print(f"Deferred matplotlib load (after the first window): {deferred * 1000:.0f} ms")
+    print("Most expensive imports before the first window:")
+    for cumulative, module in imports:
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Station sync: combines the ballots of several kiosk databases into one.
+
+Each kiosk records ballots in its own voting.db. export_delta collects the
+ballots cast there since the last export, together with the voters and
+candidates they refer to, into a gzip-compressed JSON delta, written to a file
+or sent over a local socket. merge_delta applies a delta to a central
+database. Only ballot rows past the station's export mark are read, so a sync
+costs time in proportion to the new activity, not to the size of the database.
+
+Merging is idempotent: merged ballots keep their station and station-local
+seq, a pair that is unique in the central ledger, so merging a delta twice (or
+two overlapping deltas) changes nothing. A voter with ballots at more than one
+station is counted once, for the first ballot merged; the others are kept in
+sync_conflicts for review. Merged ballots enter the central ballot ledger like
+local ones, so display_results, recounts and the election history all show
+the consolidated tallies.
+
+Elections are matched by a random id (elections.uid), not by name, so two
+elections that merely share a name are never merged. Before voting starts, each
+station adopts the id of the central database's election:
+    python station_sync.py election --db central.db            (prints the id)
+    python station_sync.py election --db voting.db --adopt ID  (on each kiosk)
+
+The socket receiver only accepts deltas signed with a shared secret (HMAC-SHA256
+over the whole compressed delta), read from the VOTING_SYNC_KEY environment
+variable or a --key-file. Deltas are capped at MAX_DELTA_SIZE bytes once
+decompressed, and a replayed delta changes nothing because merging is idempotent.
+
+Run on a kiosk:  python station_sync.py export --db voting.db --station kiosk-3 --out kiosk-3.delta.gz
+            or:  python station_sync.py export --db voting.db --send central-host:8766 --key-file sync.key
+Run centrally:   python station_sync.py merge --db central.db kiosk-*.delta.gz
+            or:  python station_sync.py receive --db central.db --port 8766 --key-file sync.key
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import socket
+import socketserver
+import zlib
+
+import voting_engine
+from voting_engine import VotingError
+
+DELTA_FORMAT = "voting-station-delta"
+DELTA_VERSION = 2
+DEFAULT_PORT = 8766
+MAX_DELTA_SIZE = 256 * 2 ** 20 # Bytes, decompressed; larger deltas are refused
+SYNC_KEY_ENV = "VOTING_SYNC_KEY"
+RECEIVE_TIMEOUT = 60 # Seconds a receiver waits on a silent sender before dropping it
+
+
+# --- Station identity ---
+def station_id(conn, station=None):
+    """
+    Returns this database's station id. The first call stores station (or the
+    host name); later calls must pass the same id or none.
+    """
+    stored = conn.execute("SELECT station_id FROM sync_state WHERE id=1").fetchone()[0]
+    if stored is None:
+        stored = station or socket.gethostname()
+        with conn:
+            conn.execute("UPDATE sync_state SET station_id=? WHERE id=1", (stored,))
+    elif station and station != stored:
+        raise VotingError(f"This database is already station {stored}.")
+    return stored
+
+def exported_seq(conn):
+    """Returns the last local ballot seq included in an export."""
+    return conn.execute("SELECT exported_seq FROM sync_state WHERE id=1").fetchone()[0]
+
+def election_uid(conn):
+    """Returns (id, name, uid) of the current election."""
+    return conn.execute("SELECT id, name, uid FROM elections WHERE id = (SELECT MAX(id) FROM elections)").fetchone()
+
+def adopt_election(conn, uid):
+    """
+    Gives the current election the uid of the central database's election, so the
+    ballots cast here merge into it. Only allowed before it has any ballots here.
+    """
+    uid = uid.strip().lower()
+    if len(uid) != 32 or any(c not in "0123456789abcdef" for c in uid):
+        raise VotingError("Not an election id.")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = voting_engine.current_election(conn)
+        if conn.execute("SELECT 1 FROM ballots WHERE election_id=? LIMIT 1", (current,)).fetchone():
+            raise VotingError("The current election already has ballots; its id can no longer change.")
+        if conn.execute("SELECT 1 FROM elections WHERE uid=? AND id != ?", (uid, current)).fetchone():
+            raise VotingError("Another election in this database already has that id.")
+        conn.execute("UPDATE elections SET uid=? WHERE id=?", (uid, current))
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def mark_exported(conn, seq):
+    """Moves the export mark forward to seq; the next delta starts after it."""
+    with conn:
+        conn.execute("UPDATE sync_state SET exported_seq=MAX(exported_seq, ?) WHERE id=1", (seq,))
+
+
+# --- Export ---
+def build_delta(conn, station=None, since=None):
+    """
+    Collects the local ballots past since (default: the export mark) into a delta dict.
+    Ballots of discarded elections are left out, as are ballots this database merged
+    from other stations.
+    """
+    station = station_id(conn, station)
+    if since is None:
+        since = exported_seq(conn)
+    conn.execute("BEGIN") # One snapshot, so the ballots, voters and to_seq agree
+    try:
+        to_seq = voting_engine.ledger_head(conn)
+        ballots = conn.execute("""
+            SELECT b.seq, b.election_id, b.username, b.party_name, b.cast_at
+            FROM ballots b JOIN elections e ON e.id = b.election_id
+            WHERE b.seq > ? AND b.seq <= ? AND b.station IS NULL AND e.status != 'Discarded'
+            ORDER BY b.seq
+        """, (since, to_seq)).fetchall()
+        voters = conn.execute("""
+            SELECT DISTINCT v.username, v.password, v.birth_year
+            FROM ballots b JOIN voters v ON v.username = b.username
+            WHERE b.seq > ? AND b.seq <= ? AND b.station IS NULL
+        """, (since, to_seq)).fetchall()
+        elections = conn.execute("""
+            SELECT id, name, uid FROM elections
+            WHERE id IN (SELECT election_id FROM ballots WHERE seq > ? AND seq <= ?)
+        """, (since, to_seq)).fetchall()
+        candidates = conn.execute("SELECT party_name, leader_name, password FROM candidates").fetchall()
+    finally:
+        conn.commit()
+    return {
+        "format": DELTA_FORMAT,
+        "version": DELTA_VERSION,
+        "station": station,
+        "from_seq": since,
+        "to_seq": to_seq,
+        "exported_at": datetime.datetime.now().strftime(voting_engine.TIME_FORMAT),
+        "elections": elections,
+        "candidates": candidates,
+        "voters": voters,
+        "ballots": ballots,
+    }
+
+def encode_delta(delta):
+    return gzip.compress(json.dumps(delta, separators=(",", ":")).encode("utf-8"))
+
+def decode_delta(data):
+    """Parses a delta produced by encode_delta. Raises VotingError if it is not one."""
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) # gzip container
+    try:
+        raw = decompressor.decompress(data, MAX_DELTA_SIZE + 1)
+        if len(raw) > MAX_DELTA_SIZE or decompressor.unconsumed_tail:
+            raise VotingError(f"Station delta is larger than {MAX_DELTA_SIZE // 2 ** 20} MB.")
+        if not decompressor.eof:
+            raise VotingError("Station delta is truncated.")
+        delta = json.loads(raw)
+    except (zlib.error, ValueError):
+        raise VotingError("Not a station delta file.")
+    if not isinstance(delta, dict) or delta.get("format") != DELTA_FORMAT:
+        raise VotingError("Not a station delta file.")
+    if delta.get("version") != DELTA_VERSION:
+        raise VotingError(f"Unsupported station delta version: {delta.get('version')}")
+    if (not isinstance(delta.get("station"), str) or not isinstance(delta.get("to_seq"), int)
+            or not all(isinstance(delta.get(key), list) for key in ("elections", "candidates", "voters", "ballots"))):
+        raise VotingError("Malformed station delta.")
+    return delta
+
+def sync_key(key_file=None):
+    """Returns the shared secret from key_file or the VOTING_SYNC_KEY environment variable, or None."""
+    if key_file:
+        with open(key_file, "rb") as f:
+            key = f.read().strip()
+    else:
+        key = os.environ.get(SYNC_KEY_ENV, "").encode("utf-8")
+    return key or None
+
+_TAG_SIZE = hashlib.sha256().digest_size
+
+def _sign(key, data):
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+def export_delta(conn, path, station=None, since=None):
+    """
+    Writes the next delta to path and advances the export mark once the file is
+    complete. Returns the delta's summary.
+    """
+    delta = build_delta(conn, station, since)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encode_delta(delta))
+    os.replace(temp_path, path)
+    mark_exported(conn, delta["to_seq"])
+    return summarize(delta)
+
+def send_delta(conn, host, port=DEFAULT_PORT, station=None, since=None, key=None):
+    """
+    Sends the next delta, signed with key (default: sync_key()), to a station_sync
+    receiver and advances the export mark once the receiver has merged it.
+    Returns the receiver's merge summary.
+    """
+    key = key or sync_key()
+    if key is None:
+        raise VotingError(f"No sync key: set {SYNC_KEY_ENV} or pass a key file.")
+    delta = build_delta(conn, station, since)
+    data = encode_delta(delta)
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(_sign(key, data) + data)
+        sock.shutdown(socket.SHUT_WR)
+        reply = json.loads(sock.makefile("rb").readline() or b"{}")
+    if "error" in reply or not reply:
+        raise VotingError(f"Merge failed at {host}:{port}: {reply.get('error', 'no reply')}")
+    mark_exported(conn, delta["to_seq"])
+    return reply
+
+def summarize(delta):
+    return {"station": delta["station"], "from_seq": delta["from_seq"], "to_seq": delta["to_seq"],
+            "ballots": len(delta["ballots"]), "voters": len(delta["voters"])}
+
+
+# --- Merge ---
+def merge_delta(conn, delta):
+    """
+    Applies a station's delta in one transaction and folds the new ballots into the
+    tallies. Returns counts of ballots merged, duplicates (voters who had already
+    voted in that election elsewhere) and ballots skipped because they were merged before.
+    """
+    station = delta["station"]
+    if station == conn.execute("SELECT station_id FROM sync_state WHERE id=1").fetchone()[0]:
+        raise VotingError("A station cannot merge its own delta.")
+    merged = duplicates = skipped = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        elections = {}
+        for station_election, name, uid in delta["elections"]:
+            row = conn.execute("SELECT id FROM elections WHERE uid=? AND status != 'Discarded'", (uid,)).fetchone()
+            if row is None:
+                raise VotingError(f"Election '{name}' from station {station} is not one of this database's elections. "
+                                  "The station must adopt this database's election id before voting.")
+            elections[station_election] = row[0]
+        conn.executemany("INSERT OR IGNORE INTO candidates (party_name, leader_name, password) VALUES (?, ?, ?)",
+                         delta["candidates"])
+        conn.executemany("INSERT OR IGNORE INTO voters (username, password, birth_year) VALUES (?, ?, ?)",
+                         delta["voters"])
+        merged_at = datetime.datetime.now().strftime(voting_engine.TIME_FORMAT)
+        for seq, station_election, username, party_name, cast_at in delta["ballots"]:
+            if conn.execute("""
+                SELECT 1 FROM ballots WHERE station=? AND station_seq=?
+                UNION ALL SELECT 1 FROM sync_conflicts WHERE station=? AND station_seq=?
+            """, (station, seq, station, seq)).fetchone():
+                skipped += 1
+                continue
+            election_id = elections[station_election]
+            claimed = conn.execute("INSERT OR IGNORE INTO participation (election_id, username) VALUES (?, ?)",
+                                   (election_id, username)).rowcount
+            if claimed:
+                voting_engine.append_ballot(conn, election_id, username, party_name, None, cast_at, station, seq)
+                merged += 1
+            else:
+                conn.execute("""
+                    INSERT INTO sync_conflicts (station, station_seq, election_id, username, party_name, cast_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (station, seq, election_id, username, party_name, cast_at))
+                duplicates += 1
+        conn.execute("""
+            INSERT INTO sync_stations (station, merged_seq, ballots, conflicts, merged_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (station) DO UPDATE SET merged_seq = MAX(merged_seq, excluded.merged_seq),
+                ballots = ballots + excluded.ballots, conflicts = conflicts + excluded.conflicts,
+                merged_at = excluded.merged_at
+        """, (station, delta["to_seq"], merged, duplicates, merged_at))
+    except (KeyError, TypeError, ValueError) as e: # Rows that do not have the shape build_delta writes
+        conn.rollback()
+        raise VotingError(f"Malformed station delta: {e!r}")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    voting_engine.refresh_tally(conn)
+    return {"station": station, "merged": merged, "duplicates": duplicates, "skipped": skipped}
+
+def merge_file(conn, path):
+    with open(path, "rb") as f:
+        return merge_delta(conn, decode_delta(f.read()))
+
+def list_stations(conn):
+    """Returns (station, merged_seq, ballots, conflicts, merged_at) for every station merged here."""
+    return conn.execute("SELECT station, merged_seq, ballots, conflicts, merged_at FROM sync_stations ORDER BY station").fetchall()
+
+def list_conflicts(conn, election_id=None):
+    """Returns (station, station_seq, username, party_name, cast_at) for ballots not counted as repeat votes."""
+    if election_id is None:
+        election_id = voting_engine.current_election(conn)
+    return conn.execute("""
+        SELECT station, station_seq, username, party_name, cast_at FROM sync_conflicts
+        WHERE election_id=? ORDER BY cast_at
+    """, (election_id,)).fetchall()
+
+
+# --- Socket receiver ---
+class DeltaReceiver(socketserver.TCPServer):
+    """
+    Merges deltas sent by send_delta, one connection at a time, and replies with the
+    summary as JSON. Deltas not signed with key (default: sync_key()) are refused.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, address, db_path=voting_engine.DB_PATH, key=None):
+        self.key = key or sync_key()
+        if self.key is None:
+            raise VotingError(f"No sync key: set {SYNC_KEY_ENV} or pass a key file.")
+        super().__init__(address, _DeltaHandler)
+        self.conn = voting_engine.connect(db_path, check_same_thread=False) # serve_forever may run on another thread
+
+    def server_close(self):
+        super().server_close()
+        self.conn.close()
+
+class _DeltaHandler(socketserver.StreamRequestHandler):
+    timeout = RECEIVE_TIMEOUT
+
+    def handle(self):
+        try:
+            reply = merge_delta(self.server.conn, self._read_delta())
+        except VotingError as e:
+            reply = {"error": str(e)}
+        except Exception as e: # Whatever the sender did, it gets an answer and the receiver keeps serving
+            reply = {"error": f"Could not merge the delta: {e!r}"}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+    def _read_delta(self):
+        """Reads a signed delta: the HMAC tag, then the compressed delta. Raises VotingError if it is refused."""
+        data = self.rfile.read(_TAG_SIZE + MAX_DELTA_SIZE + 1)
+        tag, data = data[:_TAG_SIZE], data[_TAG_SIZE:]
+        if len(data) > MAX_DELTA_SIZE:
+            raise VotingError(f"Station delta is larger than {MAX_DELTA_SIZE // 2 ** 20} MB.")
+        if not hmac.compare_digest(tag, _sign(self.server.key, data)):
+            raise VotingError("Station delta is not signed with this receiver's key.")
+        return decode_delta(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exchange ballots between polling station databases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write or send the ballots cast here since the last export")
+    export.add_argument("--db", default=voting_engine.DB_PATH)
+    export.add_argument("--station", help="this station's id (stored on first export; default: host name)")
+    export.add_argument("--since", type=int, help="export ballots after this seq instead of after the export mark")
+    export.add_argument("--key-file", help=f"shared secret for --send (default: ${SYNC_KEY_ENV})")
+    target = export.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="delta file to write")
+    target.add_argument("--send", metavar="HOST[:PORT]", help="send the delta to a receiver")
+    merge = commands.add_parser("merge", help="merge delta files into this database")
+    merge.add_argument("--db", default=voting_engine.DB_PATH)
+    merge.add_argument("files", nargs="+")
+    receive = commands.add_parser("receive", help="merge deltas sent over the network")
+    receive.add_argument("--db", default=voting_engine.DB_PATH)
+    receive.add_argument("--host", default="127.0.0.1")
+    receive.add_argument("--port", type=int, default=DEFAULT_PORT)
+    receive.add_argument("--key-file", help=f"shared secret senders sign with (default: ${SYNC_KEY_ENV})")
+    election = commands.add_parser("election", help="print the current election's id, or adopt the central one's")
+    election.add_argument("--db", default=voting_engine.DB_PATH)
+    election.add_argument("--adopt", metavar="ID", help="election id printed on the central database")
+    args = parser.parse_args()
+
+    if args.command == "receive":
+        try:
+            server = DeltaReceiver((args.host, args.port), args.db, sync_key(args.key_file))
+        except VotingError as e:
+            parser.exit(1, f"Error: {e}\n")
+        print(f"Receiving station deltas on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    conn = voting_engine.connect(args.db)
+    try:
+        if args.command == "export" and args.out:
+            print(json.dumps(export_delta(conn, args.out, args.station, args.since)))
+        elif args.command == "export":
+            host, _, port = args.send.partition(":")
+            print(json.dumps(send_delta(conn, host, int(port or DEFAULT_PORT), args.station, args.since,
+                                        sync_key(args.key_file))))
+        elif args.command == "election":
+            if args.adopt:
+                adopt_election(conn, args.adopt)
+            election_id, name, uid = election_uid(conn)
+            print(json.dumps({"id": election_id, "name": name, "uid": uid}))
+        else:
+            for path in args.files:
+                print(json.dumps(dict(merge_file(conn, path), file=path)))
+    except VotingError as e:
+        parser.exit(1, f"Error: {e}\n")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
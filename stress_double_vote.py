@@ -0,0 +1,111 @@
+"""
+Stress test for double-vote prevention.
+
+Builds a throwaway database, then fires many concurrent casts for every voter,
+each from its own connection, through both voting_engine.cast_vote and the
+group-committing BallotBatcher. Exactly one cast per voter must count.
+
+Run with: python stress_double_vote.py --voters 200 --casts-per-voter 8
+Exits with status 1 if any voter was counted more or less than once.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+import voting_engine
+from ballot_batcher import BallotBatcher
+from voting_engine import VotingError
+
+PARTIES = ["Alpha", "Beta", "Gamma"]
+
+
+def build_database(path, voters):
+    conn = voting_engine.connect(path)
+    conn.executemany("INSERT INTO voters (username, password, birth_year) VALUES (?, ?, ?)",
+                     [(f"voter{i}", "pw", 1980) for i in range(voters)])
+    for party in PARTIES:
+        voting_engine.add_candidate(conn, party, f"{party} Leader", "pw")
+    voting_engine.set_election_status(conn, 'Active')
+    conn.commit()
+    conn.close()
+
+
+def fire_casts(db_path, voters, casts_per_voter, use_batcher):
+    """Starts casts_per_voter threads per voter at once. Returns (accepted, rejected) counts."""
+    batcher = BallotBatcher(db_path) if use_batcher else None
+    start = threading.Barrier(voters * casts_per_voter)
+    accepted = []
+    rejected = []
+
+    def cast(username, party):
+        conn = None if batcher else voting_engine.connect(db_path, create_schema=False)
+        start.wait()
+        try:
+            if batcher:
+                batcher.cast_vote(username, party)
+            else:
+                voting_engine.cast_vote(conn, username, party)
+            accepted.append(username)
+        except VotingError:
+            rejected.append(username)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    threads = [threading.Thread(target=cast, args=(f"voter{i}", PARTIES[attempt % len(PARTIES)]))
+               for i in range(voters) for attempt in range(casts_per_voter)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if batcher:
+        batcher.close()
+    return accepted, rejected
+
+
+def check(db_path, voters, casts_per_voter, use_batcher):
+    """Runs one round and returns a list of problems found."""
+    build_database(db_path, voters)
+    accepted, rejected = fire_casts(db_path, voters, casts_per_voter, use_batcher)
+
+    conn = voting_engine.connect(db_path, create_schema=False)
+    total_votes = sum(votes for _, votes in voting_engine.tally(conn))
+    voted = voting_engine.count_voted(conn)
+    conn.close()
+
+    problems = []
+    if sorted(accepted) != sorted(f"voter{i}" for i in range(voters)):
+        problems.append(f"{len(accepted)} casts accepted, expected exactly one for each of {voters} voters")
+    if len(rejected) != voters * (casts_per_voter - 1):
+        problems.append(f"{len(rejected)} casts rejected, expected {voters * (casts_per_voter - 1)}")
+    if total_votes != voters:
+        problems.append(f"candidates hold {total_votes} votes, expected {voters}")
+    if voted != voters:
+        problems.append(f"{voted} voters marked as voted, expected {voters}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire concurrent casts per voter and check exactly one counts.")
+    parser.add_argument("--voters", type=int, default=100)
+    parser.add_argument("--casts-per-voter", type=int, default=8)
+    args = parser.parse_args()
+
+    failed = False
+    for use_batcher in (False, True):
+        mode = "batched" if use_batcher else "direct"
+        with tempfile.TemporaryDirectory() as tmp:
+            problems = check(os.path.join(tmp, "stress.db"), args.voters, args.casts_per_voter, use_batcher)
+        if problems:
+            failed = True
+            for problem in problems:
+                print(f"FAIL [{mode}]: {problem}")
+        else:
+            print(f"OK [{mode}]: {args.voters} voters x {args.casts_per_voter} concurrent casts, exactly one counted each")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Multi-client vote-casting server.
+
+Serves the headless voting engine over a small local HTTP/JSON endpoint so
+several kiosks can cast at the same time. Requests are handled by a fixed
+pool of worker threads, each holding its own SQLite connection.
+
+Endpoints:
+    POST /vote     {"username": ..., "password": ..., "party_name": ...}
+    GET  /state    current election state
+    GET  /results  tallies, once results have been released
+    GET  /metrics  timings in the Prometheus text format (only with --metrics)
+
+Run with: python vote_server.py --db voting.db --port 8765
+Add --batch-ms 5 to group-commit casts that arrive within 5 ms of each other,
+and --metrics to record latencies and SQL statement counts (see metrics.py).
+"""
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import metrics
+import voting_engine
+from ballot_batcher import BallotBatcher
+from election_scheduler import ElectionScheduler
+from voting_engine import VotingError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 32
+
+
+class VoteRequestHandler(BaseHTTPRequestHandler):
+    """Translates HTTP requests into voting engine calls."""
+
+    def do_GET(self):
+        if self.path == "/metrics" and metrics.enabled():
+            self.send_text(200, metrics.render_prometheus())
+            return
+        conn = self.server.connection()
+        if self.path == "/state":
+            status, start_time, end_time, results_released = voting_engine.get_election_state(conn)
+            self.send_json(200, {"status": status, "start_time": start_time,
+                                 "end_time": end_time, "results_released": bool(results_released)})
+        elif self.path == "/results":
+            if not voting_engine.get_election_state(conn)[3]:
+                self.send_json(403, {"error": "Election results have not yet been released."})
+                return
+            self.send_json(200, {"results": [{"party_name": party, "votes": votes}
+                                             for party, votes in voting_engine.tally(conn)]})
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/vote":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            username = body["username"]
+            password = body["password"]
+            party_name = body["party_name"]
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {"error": "Expected JSON with username, password and party_name."})
+            return
+
+        self.handle_vote(username, password, party_name)
+
+    @metrics.timed("http_vote")
+    def handle_vote(self, username, password, party_name):
+        conn = self.server.connection()
+        if not voting_engine.authenticate_voter(conn, username, password):
+            self.send_json(401, {"error": "Invalid voter credentials"})
+            return
+        try:
+            if self.server.batcher is not None:
+                self.server.batcher.cast_vote(username, party_name)
+            else:
+                voting_engine.cast_vote(conn, username, party_name)
+        except VotingError as e:
+            self.send_json(409, {"error": str(e)})
+            return
+        self.send_json(200, {"ok": True})
+
+    def send_json(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, code, text):
+        data = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Per-request logging to stderr dominates at high request rates
+        pass
+
+
+class VoteServer(HTTPServer):
+    """HTTP server that dispatches requests to a fixed pool of workers with one connection each."""
+
+    request_queue_size = 512
+
+    def __init__(self, address, db_path=voting_engine.DB_PATH, workers=DEFAULT_WORKERS, batch_delay=None):
+        super().__init__(address, VoteRequestHandler)
+        self.db_path = db_path
+        # Create the schema once here so workers can skip it when they connect
+        voting_engine.connect(db_path).close()
+        # With a batch delay, casts are group-committed by one writer instead of one commit each
+        self.batcher = BallotBatcher(db_path, max_delay=batch_delay) if batch_delay else None
+        # Opens and closes the election at its scheduled times when no GUI is running
+        self.scheduler = ElectionScheduler(db_path)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vote-worker")
+
+    def connection(self):
+        """Returns the calling worker thread's own connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = voting_engine.connect(self.db_path, create_schema=False, check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+        if self.batcher is not None:
+            self.batcher.close()
+        self.scheduler.close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve vote casting over HTTP for multiple kiosks.")
+    parser.add_argument("--db", default=voting_engine.DB_PATH, help="path to the voting database")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of worker threads")
+    parser.add_argument("--batch-ms", type=float, default=0,
+                        help="group-commit casts arriving within this many milliseconds (0 disables batching)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record latencies and SQL statement counts, served at /metrics")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable() # Before the server opens its connections, so they are instrumented
+    server = VoteServer((args.host, args.port), args.db, args.workers,
+                        batch_delay=args.batch_ms / 1000)
+    print(f"Vote server listening on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Streaming bulk voter import.
+
+Reads an electoral roll from CSV (header: username,password,birth_year) or
+JSONL (one {"username", "password", "birth_year"} object per line) in
+fixed-size chunks. Each chunk is validated in one pass with the same rules
+as voting_engine.validate_birth_year, checked for duplicate usernames, and
+inserted with executemany in a single transaction. Memory use depends on the
+chunk size, not on the size of the roll.
+
+Plaintext passwords are hashed on the passwords worker pool before insertion.
+At the default cost that is tens of rows per second per core, which dominates
+the import. A password that is already in the stored hash format
+("scrypt$...") is inserted as-is. So a large roll can be hashed ahead of
+time, on as many machines as needed, with --hash-to, and then imported at
+validation and insert speed. The trade-off is that whoever prepares the roll
+picks the hash parameters (hashes weaker than the current cost are upgraded
+at the voter's first login) and that a plaintext password which happens to
+look like a hash is taken as one.
+
+Usernames are checked for duplicates once before hashing, so known duplicates
+are not hashed, and again under the write lock just before the insert, so a
+voter registered while the chunk was hashing is rejected instead of aborting
+the import.
+
+Run with: python voter_import.py roll.csv --db voting.db --rejects rejects.csv
+          python voter_import.py roll.csv --hash-to hashed_roll.csv
+"""
+import argparse
+import csv
+import datetime
+import json
+import sys
+import time
+from itertools import islice
+
+import passwords
+import voting_engine
+from voting_engine import VotingError
+
+DEFAULT_CHUNK_SIZE = 50000
+_LOOKUP_BATCH = 900 # Stays under SQLite's host-parameter limit on older builds
+
+
+def read_rows(path, fmt=None):
+    """Yields (line_no, username, password, birth_year) from a CSV or JSONL file, one row at a time."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    yield line_no, record.get("username"), record.get("password"), record.get("birth_year")
+                except (ValueError, AttributeError):
+                    yield line_no, None, None, None
+        else:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            try:
+                columns = [header.index(name) for name in ("username", "password", "birth_year")]
+            except ValueError:
+                raise VotingError("CSV header must contain username, password and birth_year.")
+            username_col, password_col, birth_year_col = columns
+            width = max(columns) + 1
+            for record in reader:
+                if len(record) < width:
+                    yield reader.line_num, None, None, None
+                else:
+                    yield reader.line_num, record[username_col], record[password_col], record[birth_year_col]
+
+
+def validate_chunk(rows, current_year=None):
+    """
+    Validates a chunk of rows at once.
+    Returns (accepted, rejected) where accepted holds (line_no, username, password, birth_year)
+    and rejected holds (line_no, username, reason).
+    """
+    current_year = current_year or datetime.datetime.now().year
+    # A birth year passes every check exactly when it falls in this range
+    lowest, highest = 1000, min(9999, current_year - voting_engine.MIN_VOTING_AGE)
+    accepted = []
+    rejected = []
+    for line_no, username, password, birth_year in rows:
+        username = str(username).strip() if username is not None else ""
+        password = str(password).strip() if password is not None else ""
+        try:
+            year = int(birth_year)
+        except (TypeError, ValueError):
+            year = None
+        if username and password and year is not None and lowest <= year <= highest:
+            accepted.append((line_no, username, password, year))
+        elif not username or not password or birth_year in (None, ""):
+            rejected.append((line_no, username, "Please fill all fields for voter."))
+        else:
+            # Only rejected rows pay for the engine's per-value check, which supplies the message
+            try:
+                year = voting_engine.validate_birth_year(birth_year)
+            except VotingError as e:
+                rejected.append((line_no, username, str(e)))
+            else:
+                accepted.append((line_no, username, password, year))
+    return accepted, rejected
+
+
+def _unique_rows(accepted, rejected):
+    """Returns {username: (line_no, password, birth_year)}, rejecting usernames that repeat within the chunk."""
+    unique = {}
+    for line_no, username, password, year in accepted:
+        if username in unique:
+            rejected.append((line_no, username, "Username already exists."))
+        else:
+            unique[username] = (line_no, password, year)
+    return unique
+
+
+def _drop_existing(conn, unique, rejected):
+    """Removes the usernames already in the database from unique, rejecting their rows."""
+    names = list(unique)
+    for start in range(0, len(names), _LOOKUP_BATCH):
+        batch = names[start:start + _LOOKUP_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        for (username,) in conn.execute(f"SELECT username FROM voters WHERE username IN ({placeholders})", batch):
+            rejected.append((unique.pop(username)[0], username, "Username already exists."))
+
+
+def _hash_rows(unique):
+    """Hashes the plaintext passwords of {username: (line_no, password, birth_year)} in place, using the worker pool."""
+    plaintext = [username for username, (_, password, _) in unique.items() if not passwords.is_hashed(password)]
+    hashed = passwords.hash_passwords([unique[username][1] for username in plaintext])
+    for username, stored in zip(plaintext, hashed):
+        line_no, _, year = unique[username]
+        unique[username] = (line_no, stored, year)
+
+
+def import_voters(conn, path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, on_reject=None):
+    """
+    Imports voters from path in chunks of chunk_size rows, one transaction per chunk.
+    on_reject(line_no, username, reason) is called for every row that is not imported.
+    Returns (imported, rejected) counts.
+    """
+    rows = read_rows(path, fmt)
+    current_year = datetime.datetime.now().year
+    imported = rejected_count = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        accepted, rejected = validate_chunk(chunk, current_year)
+        unique = _unique_rows(accepted, rejected)
+        _drop_existing(conn, unique, rejected) # Not worth hashing
+        _hash_rows(unique) # Slow, so outside the write lock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _drop_existing(conn, unique, rejected) # Registered while the chunk was hashing
+            conn.executemany("INSERT INTO voters (username, password, birth_year) VALUES (?, ?, ?)",
+                             [(username, password, year) for username, (_, password, year) in unique.items()])
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        imported += len(unique)
+        rejected_count += len(rejected)
+        if on_reject:
+            for line_no, username, reason in sorted(rejected):
+                on_reject(line_no, username, reason)
+    return imported, rejected_count
+
+
+def hash_roll(path, out_path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, on_reject=None):
+    """
+    Writes a copy of the roll at path to out_path (CSV) with every password hashed,
+    ready for a fast import. Rows that fail validation are passed to on_reject and
+    left out. Returns (written, rejected) counts.
+    """
+    rows = read_rows(path, fmt)
+    current_year = datetime.datetime.now().year
+    written = rejected_count = 0
+    with open(out_path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(["username", "password", "birth_year"])
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            accepted, rejected = validate_chunk(chunk, current_year)
+            unique = _unique_rows(accepted, rejected)
+            _hash_rows(unique)
+            writer.writerows((username, password, year) for username, (_, password, year) in unique.items())
+            written += len(unique)
+            rejected_count += len(rejected)
+            if on_reject:
+                for line_no, username, reason in sorted(rejected):
+                    on_reject(line_no, username, reason)
+    return written, rejected_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import voters from CSV or JSONL.")
+    parser.add_argument("path", help="CSV (username,password,birth_year) or JSONL file")
+    parser.add_argument("--db", default=voting_engine.DB_PATH, help="path to the voting database")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--rejects", help="write rejected rows to this CSV file instead of stderr")
+    parser.add_argument("--hash-to", metavar="OUT",
+                        help="write the roll with hashed passwords to this CSV file instead of importing it")
+    args = parser.parse_args()
+
+    rejects_file = open(args.rejects, "w", newline="", encoding="utf-8") if args.rejects else sys.stderr
+    writer = csv.writer(rejects_file)
+    writer.writerow(["line", "username", "reason"])
+
+    started = time.perf_counter()
+    if args.hash_to:
+        try:
+            written, rejected = hash_roll(args.path, args.hash_to, args.format, args.chunk_size,
+                                          on_reject=lambda *row: writer.writerow(row))
+        finally:
+            if args.rejects:
+                rejects_file.close()
+        print(f"Hashed {written} passwords into {args.hash_to}, rejected {rejected} rows "
+              f"in {time.perf_counter() - started:.2f}s")
+        return
+
+    conn = voting_engine.connect(args.db)
+    try:
+        imported, rejected = import_voters(conn, args.path, args.format, args.chunk_size,
+                                           on_reject=lambda *row: writer.writerow(row))
+    finally:
+        conn.close()
+        if args.rejects:
+            rejects_file.close()
+    elapsed = time.perf_counter() - started
+    rate = (imported + rejected) / elapsed if elapsed > 0 else 0
+    print(f"Imported {imported} voters, rejected {rejected} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
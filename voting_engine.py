@@ -0,0 +1,692 @@
+"""
+Headless voting engine.
+
+Everything the Tkinter front end in vm_1.py does against the database lives
+here as plain functions taking an sqlite3 connection, so the same operations
+can be driven from workers, load generators and benchmarks without importing
+Tk or matplotlib.
+"""
+import datetime
+import hmac
+import sqlite3
+import time
+
+import ballot_chain
+import metrics
+import migrations
+import passwords
+
+DB_PATH = "voting.db"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+BUSY_TIMEOUT = 30.0 # Seconds a writer waits for the database lock before giving up
+MIN_VOTING_AGE = 18
+STATE_RECHECK_INTERVAL = 0.25 # Seconds a cached election state is trusted before re-checking data_version
+FOLD_INTERVAL = 256 # Unfolded ballots that make the next cast fold them into the tallies
+
+
+class VotingError(Exception):
+    """Raised when an operation is rejected. The message is shown to the user as-is."""
+
+
+class VotingConnection(sqlite3.Connection):
+    """sqlite3 connection that also carries this engine's per-connection caches."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (data_version, checked_at, state row) from the last election state read, see get_election_state
+        self.election_state_cache = None
+
+
+class InstrumentedConnection(VotingConnection):
+    """
+    VotingConnection that reports to the metrics module: every statement (including the
+    BEGIN/COMMIT sqlite3 issues on its own) is counted through the trace callback, and
+    statements run through execute/executemany are timed. Only used while metrics are on.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(metrics.trace_statement)
+
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+
+# --- Connection and schema ---
+def connect(path=DB_PATH, create_schema=True, check_same_thread=True):
+    """
+    Opens a connection to the voting database.
+    The database is switched to WAL journaling so readers never block the writer,
+    and writers wait up to BUSY_TIMEOUT for the lock instead of failing with
+    "database is locked". Pass create_schema=False when the schema is known to exist,
+    e.g. for per-thread connections opened by a server.
+    While metrics are enabled the connection is instrumented (see metrics.py).
+    """
+    factory = InstrumentedConnection if metrics.enabled() else VotingConnection
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread,
+                           factory=factory)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if create_schema:
+        init_schema(conn)
+    return conn
+
+def init_schema(conn):
+    """Creates the tables if they don't exist and applies pending schema migrations."""
+    migrations.migrate(conn)
+
+
+# --- Validation ---
+def validate_birth_year(birth_year):
+    """Checks a birth year is 4 digits, not in the future and at least MIN_VOTING_AGE years ago. Returns it as an int."""
+    try:
+        birth_year_int = int(birth_year)
+    except (TypeError, ValueError):
+        raise VotingError("Invalid birth year. Please enter a 4-digit number.")
+    if not 1000 <= birth_year_int <= 9999:
+        raise VotingError("Birth year must be a 4-digit number.")
+    current_year = datetime.datetime.now().year
+    if birth_year_int > current_year:
+        raise VotingError("Birth year cannot be in the future.")
+    if current_year - birth_year_int < MIN_VOTING_AGE:
+        raise VotingError(f"Voter must be at least {MIN_VOTING_AGE} years old.")
+    return birth_year_int
+
+
+# --- Passwords ---
+def _check_password(conn, table, key_column, key, password):
+    """
+    Verifies password against the hash stored for key. A legacy plaintext password,
+    or a hash made with an older cost setting, is replaced by a hash at the current
+    cost once the password checks out.
+    """
+    row = conn.execute(f"SELECT password FROM {table} WHERE {key_column}=?", (key,)).fetchone()
+    if row is None:
+        passwords.burn_verification()
+        return False
+    stored = row[0]
+    if stored is not None and not passwords.is_hashed(stored):
+        passwords.burn_verification() # Plaintext rows take as long to check as hashed ones
+        if password is None or not hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")):
+            return False
+    elif not passwords.verify_password(password, stored):
+        return False
+    if passwords.needs_rehash(stored):
+        with conn:
+            conn.execute(f"UPDATE {table} SET password=? WHERE {key_column}=? AND password=?",
+                         (passwords.hash_password(password), key, stored))
+    return True
+
+def _password_for_update(conn, table, key_column, key, password):
+    """Edit forms send back the stored hash when the password was left alone; only new passwords are hashed."""
+    row = conn.execute(f"SELECT password FROM {table} WHERE {key_column}=?", (key,)).fetchone()
+    if row is not None and row[0] == password:
+        return password
+    return passwords.hash_password(password)
+
+
+# --- Admins ---
+def register_admin(conn, username, password):
+    """Registers a new admin account."""
+    if not username or not password:
+        raise VotingError("Please fill all fields")
+    try:
+        conn.execute("INSERT INTO admin (username, password) VALUES (?, ?)", (username, passwords.hash_password(password)))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        raise VotingError("Username already exists")
+
+@metrics.timed("admin_login")
+def authenticate_admin(conn, username, password):
+    """Returns True if the admin credentials are valid."""
+    return _check_password(conn, "admin", "username", username, password)
+
+
+# --- Voters ---
+def register_voter(conn, username, password, birth_year):
+    """Registers a new voter after validating the birth year."""
+    if not username or not password or not birth_year:
+        raise VotingError("Please fill all fields for voter.")
+    birth_year_int = validate_birth_year(birth_year)
+    try:
+        conn.execute("INSERT INTO voters (username, password, birth_year) VALUES (?, ?, ?)",
+                     (username, passwords.hash_password(password), birth_year_int))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        raise VotingError("Username already exists.")
+
+def update_voter(conn, old_username, username, password, birth_year):
+    """Updates a voter's username, password and birth year."""
+    if not username or not password or not birth_year:
+        raise VotingError("Please fill all fields to update.")
+    birth_year_int = validate_birth_year(birth_year)
+    password = _password_for_update(conn, "voters", "username", old_username, password)
+    try:
+        conn.execute("UPDATE voters SET username=?, password=?, birth_year=? WHERE username=?",
+                     (username, password, birth_year_int, old_username))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        raise VotingError("New username already exists.")
+
+def delete_voter(conn, username):
+    """Deletes a voter."""
+    conn.execute("DELETE FROM voters WHERE username=?", (username,))
+    conn.commit()
+
+# Whether a voter has a ballot in the current election, as a column of a voters query
+_VOTED = """
+    EXISTS (SELECT 1 FROM participation p
+            WHERE p.election_id = (SELECT MAX(id) FROM elections) AND p.username = voters.username)
+"""
+
+@metrics.timed("load_voters")
+def list_voters(conn):
+    """Returns (username, password, birth_year, voted) for every voter, voted meaning in the current election."""
+    return conn.execute(f"SELECT username, password, birth_year, {_VOTED} FROM voters").fetchall()
+
+def registered_voter_count(conn):
+    """Returns the number of registered voters without scanning the voters table."""
+    return conn.execute("SELECT registered FROM voter_stats WHERE id=1").fetchone()[0]
+
+def voter_roll_version(conn):
+    """Returns (registered voters, change counter). It changes whenever a voter is added, removed, renamed or gets a new birth year."""
+    return conn.execute("SELECT registered, changes FROM voter_stats WHERE id=1").fetchone()
+
+@metrics.timed("load_voters_page")
+def page_voters(conn, after=None, limit=200, prefix=None, birth_year=None, voted=None):
+    """
+    Returns up to limit (username, password, birth_year, voted) rows ordered by username,
+    voted meaning in the current election.
+    Keyset pagination: pass the last username of the previous page as after, so each
+    page is an index range scan no matter how deep into the roll it is.
+    prefix, birth_year and voted narrow the results; None means no filter.
+    """
+    clauses = []
+    params = []
+    if after is not None:
+        clauses.append("username > ?")
+        params.append(after)
+    if prefix:
+        # A range instead of LIKE so the primary key index can be used
+        clauses.append("username >= ? AND username < ?")
+        params += [prefix, prefix + "\U0010ffff"]
+    if birth_year is not None:
+        clauses.append("birth_year = ?")
+        params.append(birth_year)
+    if voted is not None:
+        clauses.append(_VOTED if voted else f"NOT {_VOTED}")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+    return conn.execute(f"SELECT username, password, birth_year, {_VOTED} FROM voters {where} ORDER BY username LIMIT ?",
+                        params).fetchall()
+
+@metrics.timed("voter_login")
+def authenticate_voter(conn, username, password):
+    """Returns True if the voter credentials are valid."""
+    return _check_password(conn, "voters", "username", username, password)
+
+def has_voted(conn, username):
+    """Returns True if the voter has already cast a ballot in the current election."""
+    row = conn.execute("SELECT 1 FROM participation WHERE election_id=(SELECT MAX(id) FROM elections) AND username=?",
+                       (username,)).fetchone()
+    return row is not None
+
+def count_voted(conn, election_id=None):
+    """Returns how many voters cast a ballot in an election, by default the current one."""
+    if election_id is None:
+        election_id = current_election(conn)
+    return conn.execute("SELECT COUNT(*) FROM participation WHERE election_id=?", (election_id,)).fetchone()[0]
+
+
+# --- Candidates ---
+def add_candidate(conn, party_name, leader_name, password):
+    """Registers a new candidate party."""
+    if not party_name or not leader_name or not password:
+        raise VotingError("Please fill all fields for candidate.")
+    try:
+        conn.execute("INSERT INTO candidates (party_name, leader_name, password) VALUES (?, ?, ?)",
+                     (party_name, leader_name, passwords.hash_password(password)))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        raise VotingError("Party name already exists.")
+
+def update_candidate(conn, old_party_name, party_name, leader_name, password):
+    """Updates a candidate's party name, leader name and password."""
+    if not party_name or not leader_name or not password:
+        raise VotingError("Please fill all fields to update.")
+    # Hash before taking the write lock so other writers are not kept waiting on the KDF
+    password = _password_for_update(conn, "candidates", "party_name", old_party_name, password)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Ballots already cast name the old party, so fold them in before renaming
+        applied_seq = _apply_pending_ballots(conn)
+        conn.execute("UPDATE candidates SET party_name=?, leader_name=?, password=? WHERE party_name=?",
+                     (party_name, leader_name, password, old_party_name))
+        if party_name != old_party_name:
+            # Only the current election's counts move; past elections keep the name they were counted under
+            conn.execute("UPDATE tallies SET party_name=? WHERE party_name=? AND election_id=(SELECT MAX(id) FROM elections)",
+                         (party_name, old_party_name))
+            _log_party_rename(conn, applied_seq, old_party_name, party_name)
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise VotingError("New party name already exists.")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def delete_candidate(conn, party_name):
+    """Deletes a candidate and its votes in the current election. Past elections keep their tallies."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Fold ballots already cast first, so none for this party reach the tallies afterwards
+        applied_seq = _apply_pending_ballots(conn)
+        if conn.execute("DELETE FROM candidates WHERE party_name=?", (party_name,)).rowcount:
+            conn.execute("DELETE FROM tallies WHERE election_id=(SELECT MAX(id) FROM elections) AND party_name=?",
+                         (party_name,))
+            _log_party_rename(conn, applied_seq, party_name, None)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def _log_party_rename(conn, applied_seq, old_party_name, party_name):
+    """Records a rename (or, with party_name None, a deletion) so the ledger can still be checked against tallies."""
+    conn.execute(f"""
+        INSERT INTO party_renames (election_id, seq, old_name, new_name, changed_at)
+        SELECT id, ?, ?, ?, ? FROM elections WHERE {_CURRENT_ELECTION}
+    """, (applied_seq, old_party_name, party_name, datetime.datetime.now().strftime(TIME_FORMAT)))
+
+# Vote totals per party in election {election}: the counter shards added up, plus the ballots
+# not folded into them yet. One statement reads one snapshot, so no write lock is needed and
+# a fold committing in between cannot count a ballot twice.
+_ELECTION_TOTALS = """
+    SELECT party_name, SUM(votes) AS votes FROM (
+        SELECT party_name, votes FROM tallies WHERE election_id = {election}
+        UNION ALL
+        SELECT party_name, COUNT(*) FROM ballots
+        WHERE seq > (SELECT applied_seq FROM tally_state WHERE id=1) AND election_id = {election}
+        GROUP BY party_name
+    ) GROUP BY party_name
+"""
+
+# Candidate vote totals in the current election
+_CANDIDATE_TOTALS = f"""
+    SELECT c.party_name, c.leader_name, c.password, COALESCE(t.votes, 0) AS total
+    FROM candidates c
+    LEFT JOIN ({_ELECTION_TOTALS.format(election="(SELECT MAX(id) FROM elections)")}) t ON t.party_name = c.party_name
+"""
+
+def candidate_version(conn):
+    """Returns the candidate change counter. It changes whenever a candidate is added, removed or edited."""
+    return conn.execute("SELECT changes FROM candidate_stats WHERE id=1").fetchone()[0]
+
+@metrics.timed("load_candidates")
+def list_candidates(conn):
+    """Returns (party_name, leader_name, password, votes) for every candidate, votes in the current election."""
+    return conn.execute(_CANDIDATE_TOTALS).fetchall()
+
+
+# --- Voting ---
+@metrics.timed("cast_vote")
+def cast_vote(conn, username, party_name, shard=None):
+    """
+    Records one ballot for party_name on behalf of username and commits it.
+    With a shard number the vote is tallied into that counter shard (see record_vote).
+    """
+    # Take the write lock up front so the claim and the ballot happen as one unit,
+    # even when several connections are casting at the same time.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        record_vote(conn, username, party_name, shard)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+@metrics.timed("record_vote")
+def record_vote(conn, username, party_name, shard=None):
+    """
+    Applies one ballot inside the caller's transaction without committing.
+    The voter's ballot is claimed with a single conditional INSERT into the current
+    election's participation, so two sessions for the same voter can never both
+    count, and no separate read is needed on the success path. Raises VotingError
+    if the ballot is rejected; the caller must roll back in that case.
+
+    The ballot is appended to the hash-chained ledger (see append_ballot); no
+    counter row is touched here; every FOLD_INTERVAL ballots the cast that crosses
+    the mark folds them into the counters (see _fold_if_due), and readers add up
+    the rest themselves. Ballots cast with a shard number (e.g. a worker index or
+    polling station id) are tallied into their own tallies row, and totals add the
+    shards back up on read.
+    """
+    cast_at = datetime.datetime.now().strftime(TIME_FORMAT)
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO participation (election_id, username)
+        SELECT e.id, v.username FROM elections e, voters v
+        WHERE e.id = (SELECT MAX(id) FROM elections) AND {_VOTING_OPEN} AND v.username=?
+    """, (cast_at, cast_at, username))
+    if cursor.rowcount != 1:
+        raise _ballot_rejection(conn, username, cast_at)
+    election_id, known = conn.execute(
+        "SELECT MAX(id), EXISTS (SELECT 1 FROM candidates WHERE party_name=?) FROM elections", (party_name,)).fetchone()
+    if not known:
+        raise VotingError(f"Unknown candidate: {party_name}")
+    append_ballot(conn, election_id, username, party_name, shard, cast_at)
+    _fold_if_due(conn)
+
+# True for an election row e that accepts ballots at the time bound to both parameters.
+# The stored times are checked alongside the status, so a ballot cast after end_time is
+# refused even if the scheduler has not closed the election yet, and one cast after
+# start_time is accepted even if it has not opened it yet.
+_VOTING_OPEN = """
+    e.status IN ('Active', 'Pending')
+    AND COALESCE(e.start_time <= ?, e.status = 'Active')
+    AND COALESCE(e.end_time > ?, 1)
+"""
+
+def _ballot_rejection(conn, username, cast_at):
+    """Works out why a ballot claim matched no row. Only runs on the failure path."""
+    status, start_time, end_time, _ = _read_election_state(conn)
+    if status == 'Pending' and start_time and start_time > cast_at:
+        return VotingError(f"Voting has not started yet. It opens at {start_time}.")
+    if end_time and end_time <= cast_at and status in ('Active', 'Pending'):
+        return VotingError(f"Voting closed at {end_time}.")
+    if status != 'Active' and not (status == 'Pending' and start_time):
+        return VotingError("Voting is only allowed when the election is Active.")
+    if conn.execute("SELECT 1 FROM voters WHERE username=?", (username,)).fetchone() is None:
+        return VotingError(f"Unknown voter: {username}")
+    return VotingError("You have already cast your vote in this election.")
+
+@metrics.timed("results")
+def tally(conn, election_id=None):
+    """
+    Returns (party_name, votes), highest first. For the current election (the default)
+    every candidate is listed; for a past election, every party that received votes.
+    Read-only: ballots not folded into the counters yet are added on the fly.
+    """
+    if election_id is None or election_id == current_election(conn):
+        return conn.execute(f"SELECT party_name, total FROM ({_CANDIDATE_TOTALS}) ORDER BY total DESC").fetchall()
+    return conn.execute(f"""
+        SELECT party_name, votes FROM ({_ELECTION_TOTALS.format(election="?1")}) WHERE votes != 0 ORDER BY votes DESC
+    """, (election_id,)).fetchall()
+
+
+# --- Ballot ledger ---
+def append_ballot(conn, election_id, username, party_name, shard, cast_at, station=None, station_seq=None):
+    """
+    Appends a ballot to the ledger inside the caller's transaction, chained to the
+    previous entry by its hash (see ballot_chain.py). The caller holds the write
+    lock, so the previous entry cannot change underneath.
+    """
+    previous = conn.execute("SELECT chain_hash FROM ballots ORDER BY seq DESC LIMIT 1").fetchone()
+    chain_hash = ballot_chain.entry_hash(previous[0] if previous else ballot_chain.GENESIS,
+                                         election_id, username, party_name, shard, cast_at, station, station_seq)
+    conn.execute("""
+        INSERT INTO ballots (election_id, username, party_name, shard, cast_at, station, station_seq, chain_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (election_id, username, party_name, shard, cast_at, station, station_seq, chain_hash))
+
+def ledger_head(conn):
+    """Returns the sequence number of the newest ballot, or 0 if none have been cast."""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ballots").fetchone()[0]
+
+def results_version(conn):
+    """
+    Returns a cheap fingerprint of the current tallies: (newest ballot seq, current election id).
+    It only changes when a ballot is cast or a new election starts, so pollers can
+    skip re-reading the tallies while it stays the same.
+    """
+    return conn.execute("SELECT (SELECT COALESCE(MAX(seq), 0) FROM ballots), (SELECT MAX(id) FROM elections)").fetchone()
+
+@metrics.timed("refresh_tally")
+def refresh_tally(conn):
+    """
+    Folds ballots cast since the last refresh into the vote counters.
+    Costs one indexed lookup when nothing new has been cast. Returns the last applied sequence number.
+    """
+    applied_seq = conn.execute("SELECT applied_seq FROM tally_state WHERE id=1").fetchone()[0]
+    if ledger_head(conn) == applied_seq:
+        return applied_seq
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        applied_seq = _apply_pending_ballots(conn)
+        ballot_chain.create_checkpoints(conn)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return applied_seq
+
+def _fold_if_due(conn):
+    """Folds pending ballots and adds due checkpoints, inside the caller's write transaction, once FOLD_INTERVAL have piled up."""
+    applied_seq = conn.execute("SELECT applied_seq FROM tally_state WHERE id=1").fetchone()[0]
+    if ledger_head(conn) - applied_seq >= FOLD_INTERVAL:
+        _apply_pending_ballots(conn)
+        ballot_chain.create_checkpoints(conn)
+
+def _apply_pending_ballots(conn):
+    """Adds ballots past applied_seq to the counters inside the caller's transaction."""
+    applied_seq = conn.execute("SELECT applied_seq FROM tally_state WHERE id=1").fetchone()[0]
+    pending = conn.execute("""
+        SELECT election_id, party_name, COALESCE(shard, 0), COUNT(*), MAX(seq) FROM ballots
+        WHERE seq > ? GROUP BY election_id, party_name, shard
+    """, (applied_seq,)).fetchall()
+    for election_id, party_name, shard, count, max_seq in pending:
+        conn.execute("""
+            INSERT INTO tallies (election_id, party_name, shard, votes) VALUES (?, ?, ?, ?)
+            ON CONFLICT (election_id, party_name, shard) DO UPDATE SET votes = votes + excluded.votes
+        """, (election_id, party_name, shard, count))
+        applied_seq = max(applied_seq, max_seq)
+    conn.execute("UPDATE tally_state SET applied_seq=? WHERE id=1", (applied_seq,))
+    return applied_seq
+
+def recount_ledger(conn, election_id=None):
+    """
+    Recounts an election, by default the current one, from the ballot ledger in one
+    streaming pass. Returns {party_name: votes}.
+    """
+    if election_id is None:
+        election_id = current_election(conn)
+    counts = {}
+    for (party_name,) in conn.execute("SELECT party_name FROM ballots WHERE election_id=?", (election_id,)):
+        counts[party_name] = counts.get(party_name, 0) + 1
+    return counts
+
+
+# --- Elections ---
+# The newest election is the current one; casts, tallies and state changes apply to it
+_CURRENT_ELECTION = "id = (SELECT MAX(id) FROM elections)"
+
+def current_election(conn):
+    """Returns the id of the current election."""
+    return conn.execute("SELECT MAX(id) FROM elections").fetchone()[0]
+
+def list_elections(conn):
+    """Returns (id, name, status, start_time, end_time, results_released) for every election, newest first."""
+    return conn.execute("""
+        SELECT id, name, status, start_time, end_time, results_released FROM elections ORDER BY id DESC
+    """).fetchall()
+
+def _insert_election(conn, name=None):
+    cursor = conn.execute("""
+        INSERT INTO elections (name, status, created_at, uid)
+        VALUES (COALESCE(?, 'Election ' || (COALESCE((SELECT MAX(id) FROM elections), 0) + 1)), 'Pending', ?,
+                lower(hex(randomblob(16))))
+    """, (name, datetime.datetime.now().strftime(TIME_FORMAT)))
+    return cursor.lastrowid
+
+def new_election(conn, name=None):
+    """
+    Starts a new Pending election and makes it the current one. Returns its id.
+    Nothing is cleared or copied: no voter has a participation row in the new
+    election yet, so this costs the same however large the roll is. Earlier
+    elections keep their ballots and tallies.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _read_election_state(conn)[0] == 'Active':
+            raise VotingError("End the current election before starting a new one.")
+        election_id = _insert_election(conn, name)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    invalidate_election_state(conn)
+    return election_id
+
+
+# --- Election state ---
+def get_election_state(conn):
+    """
+    Retrieves the current election's status, start and end times, and results released status.
+    Connections from connect() cache the row. Writes through this engine clear the cache
+    straight away. Writes from other connections or processes are picked up through
+    PRAGMA data_version, checked at most every STATE_RECHECK_INTERVAL seconds, so
+    repeated reads in between run no query at all.
+    """
+    if not isinstance(conn, VotingConnection):
+        return _read_election_state(conn)
+    now = time.monotonic()
+    cached = conn.election_state_cache
+    if cached is not None and now - cached[1] < STATE_RECHECK_INTERVAL:
+        return cached[2]
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if cached is not None and cached[0] == data_version:
+        conn.election_state_cache = (data_version, now, cached[2])
+        return cached[2]
+    state = _read_election_state(conn)
+    conn.election_state_cache = (data_version, now, state)
+    return state
+
+def _read_election_state(conn):
+    return conn.execute(f"SELECT status, start_time, end_time, results_released FROM elections WHERE {_CURRENT_ELECTION}").fetchone()
+
+def invalidate_election_state(conn):
+    """Drops conn's cached election state, e.g. after another connection changed the election."""
+    if isinstance(conn, VotingConnection):
+        conn.election_state_cache = None
+
+def set_election_status(conn, new_status, start_time=None, end_time=None):
+    """
+    Sets the current election's status and updates start/end times.
+    start_time and end_time should be datetime objects or None.
+    A start time in the future schedules the election: it stays Pending until then.
+    An end time in the future, given when starting or closing, leaves it Active until then.
+    The switch at those times is made by apply_schedule.
+    Resets results_released to 0 if status is not 'Closed'.
+    Returns the message to show the user.
+    """
+    current_time_str = datetime.datetime.now().strftime(TIME_FORMAT)
+
+    if new_status == 'Active':
+        start_time_str = start_time.strftime(TIME_FORMAT) if start_time else current_time_str
+        end_time_str = end_time.strftime(TIME_FORMAT) if end_time else None
+        if end_time_str and end_time_str <= start_time_str:
+            raise VotingError("End time must be after the start time.")
+        scheduled = start_time_str > current_time_str
+        conn.execute(f"UPDATE elections SET status=?, start_time=?, end_time=?, results_released=0 WHERE {_CURRENT_ELECTION}",
+                     ('Pending' if scheduled else 'Active', start_time_str, end_time_str))
+        if scheduled:
+            status_msg = f"Election is scheduled to start at {start_time_str}."
+        else:
+            status_msg = "Election has started and is now Active!"
+        if end_time_str:
+            status_msg += f" It will close at {end_time_str}."
+    elif new_status == 'Closed':
+        end_time_str = end_time.strftime(TIME_FORMAT) if end_time else current_time_str
+        if end_time_str > current_time_str:
+            conn.execute(f"UPDATE elections SET end_time=? WHERE {_CURRENT_ELECTION}", (end_time_str,))
+            status_msg = f"Election will close at {end_time_str}."
+        else:
+            # When closing, we don't change results_released here. It's handled by release_results()
+            conn.execute(f"UPDATE elections SET status=?, end_time=? WHERE {_CURRENT_ELECTION}", (new_status, end_time_str))
+            status_msg = "Election has ended and is now Closed!"
+    elif new_status == 'Pending':
+        conn.execute(f"UPDATE elections SET status=?, start_time=NULL, end_time=NULL, results_released=0 WHERE {_CURRENT_ELECTION}",
+                     (new_status,))
+        status_msg = "Election has been set to Pending!"
+    else:
+        raise VotingError(f"Unknown election status: {new_status}")
+
+    conn.commit()
+    invalidate_election_state(conn)
+    return status_msg
+
+def next_transition(state, now=None):
+    """
+    Returns (seconds until the next scheduled status change, status it changes to) for an
+    election state tuple from get_election_state, or None if nothing is scheduled.
+    Works on the state alone, so pollers can call it without touching the database.
+    """
+    status, start_time, end_time, _ = state
+    if status == 'Pending' and start_time:
+        due, new_status = start_time, 'Active'
+    elif status == 'Active' and end_time:
+        due, new_status = end_time, 'Closed'
+    else:
+        return None
+    now = now or datetime.datetime.now()
+    return max((datetime.datetime.strptime(due, TIME_FORMAT) - now).total_seconds(), 0.0), new_status
+
+def apply_schedule(conn, now=None):
+    """
+    Opens or closes the current election if its start or end time has passed.
+    Safe to call from any number of processes: each switch is a conditional UPDATE
+    that only matches once. Returns the new status if it changed, else None.
+    """
+    now_str = (now or datetime.datetime.now()).strftime(TIME_FORMAT)
+    with conn:
+        opened = conn.execute(f"""
+            UPDATE elections SET status='Active', results_released=0
+            WHERE {_CURRENT_ELECTION} AND status='Pending' AND start_time <= ? AND COALESCE(end_time > ?, 1)
+        """, (now_str, now_str)).rowcount
+        closed = conn.execute(f"""
+            UPDATE elections SET status='Closed'
+            WHERE {_CURRENT_ELECTION} AND status IN ('Active', 'Pending') AND end_time <= ?
+        """, (now_str,)).rowcount
+    # Also when nothing matched: another process may have made the switch first
+    invalidate_election_state(conn)
+    if not opened and not closed:
+        return None
+    return 'Closed' if closed else 'Active'
+
+def release_results(conn):
+    """Closes the Active election and releases the results."""
+    if _read_election_state(conn)[0] != 'Active':
+        raise VotingError("Election must be Active to end and release results.")
+    current_time_str = datetime.datetime.now().strftime(TIME_FORMAT)
+    conn.execute(f"UPDATE elections SET status='Closed', end_time=?, results_released=1 WHERE {_CURRENT_ELECTION}",
+                 (current_time_str,))
+    conn.commit()
+    invalidate_election_state(conn)
+
+@metrics.timed("reset_election")
+def reset_election(conn):
+    """
+    Clears all votes by replacing the current election with a fresh Pending one of the same name.
+    The old election stays in the history, marked Discarded, with its ballots and tallies.
+    The election id works as a generation number: participation and tallies are keyed by
+    it, so the new election starts empty without touching a single voter row, and a reset
+    takes the same time on any roll size (see reset_benchmark.py).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        name = conn.execute(f"SELECT name FROM elections WHERE {_CURRENT_ELECTION}").fetchone()[0]
+        conn.execute(f"UPDATE elections SET status='Discarded' WHERE {_CURRENT_ELECTION}")
+        _insert_election(conn, name)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    invalidate_election_state(conn)
@@ -0,0 +1,193 @@
+"""
+Load generator and benchmark for the voting workflow.
+
+Builds a synthetic database (N voters, M candidates) and drives the same engine
+calls the GUI makes: registering voters, logging in, casting votes with a
+skewed (Zipf) candidate distribution, querying results, paging the voter list
+and resetting the election. Each operation runs single-threaded and then
+concurrently from several threads, each with its own connection, and the
+report gives throughput, p50/p99 latency and the database size as JSON, so
+runs can be compared between versions.
+
+Run with: python workload_benchmark.py --voters 100000 --candidates 8 --threads 8 > run.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import migrations
+import passwords
+import voting_engine
+from voting_engine import VotingError
+
+
+# --- Synthetic data ---
+def build_database(path, voters, candidates):
+    """Creates the schema, a roll of voters and the candidates. Returns the party names."""
+    conn = voting_engine.connect(path, create_schema=False)
+    migrations.migrate(conn, log=None) # Keep stdout for the JSON report
+    parties = [f"Party{i:03d}" for i in range(candidates)]
+    for party in parties:
+        voting_engine.add_candidate(conn, party, f"Leader of {party}", "pw")
+    # One shared hash: these voters are only used for casting and paging, not for login
+    stored = passwords.hash_password("pw")
+    with conn:
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+            INSERT INTO voters (username, password, birth_year)
+            SELECT printf('voter%08d', i), ?, 1940 + i % 60 FROM n
+        """, (voters, stored))
+    conn.close()
+    return parties
+
+def zipf_choices(parties, count, skew, rng):
+    """Picks count parties where the k-th most popular gets weight 1 / k**skew (skew 0 is uniform)."""
+    weights = [1 / (rank + 1) ** skew for rank in range(len(parties))]
+    return rng.choices(parties, weights=weights, k=count)
+
+def database_bytes(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+# --- Measurement ---
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+def run_operation(path, items, work, threads):
+    """
+    Calls work(conn, item) for every item, spread over threads threads with one
+    connection each. Returns throughput and latency figures; rejected operations
+    (VotingError) are counted separately and still timed.
+    """
+    chunks = [items[i::threads] for i in range(threads)]
+    latencies = [[] for _ in range(threads)]
+    errors = [0] * threads
+    spans = [None] * threads # (first operation began, last one ended) per thread
+    start = threading.Barrier(threads)
+
+    def worker(index):
+        conn = voting_engine.connect(path, create_schema=False)
+        samples = latencies[index]
+        start.wait()
+        try:
+            first = time.perf_counter()
+            for item in chunks[index]:
+                began = time.perf_counter()
+                try:
+                    work(conn, item)
+                except VotingError:
+                    errors[index] += 1
+                samples.append(time.perf_counter() - began)
+            spans[index] = (first, time.perf_counter())
+        finally:
+            conn.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    # From the first thread starting to the last one finishing, timed by the threads themselves,
+    # so neither the main thread's wake-up nor the connection teardown counts
+    spans = [span for span in spans if span is not None] # None if the thread died
+    elapsed = max(end for _, end in spans) - min(first for first, _ in spans) if spans else 0.0
+
+    samples = sorted(s for per_thread in latencies for s in per_thread)
+    return {
+        "count": len(samples),
+        "rejected": sum(errors),
+        "seconds": elapsed,
+        "ops_per_s": len(samples) / elapsed if elapsed > 0 else None,
+        "p50_ms": percentile(samples, 0.50) * 1000 if samples else None,
+        "p99_ms": percentile(samples, 0.99) * 1000 if samples else None,
+        "max_ms": samples[-1] * 1000 if samples else None,
+    }
+
+
+# --- Workflow ---
+def run_workflow(path, args, threads, rng):
+    """Runs every operation once against a fresh database. Returns {operation: figures}."""
+    parties = build_database(path, args.voters, args.candidates)
+    conn = voting_engine.connect(path, create_schema=False)
+    voting_engine.set_election_status(conn, 'Active')
+    results = {}
+
+    new_voters = [(f"new{i:07d}", f"secret{i}") for i in range(args.registrations)]
+    results["register"] = run_operation(
+        path, new_voters, lambda c, v: voting_engine.register_voter(c, v[0], v[1], "1985"), threads)
+    results["login"] = run_operation(
+        path, new_voters, lambda c, v: voting_engine.authenticate_voter(c, v[0], v[1]), threads)
+
+    casters = rng.sample(range(args.voters), min(args.casts, args.voters))
+    ballots = list(zip((f"voter{i:08d}" for i in casters), zipf_choices(parties, len(casters), args.skew, rng)))
+    results["cast_vote"] = run_operation(
+        path, ballots, lambda c, b: voting_engine.cast_vote(c, b[0], b[1]), threads)
+
+    results["results_query"] = run_operation(path, list(range(args.queries)), lambda c, _: voting_engine.tally(c), threads)
+    results["list_candidates"] = run_operation(
+        path, list(range(args.queries)), lambda c, _: voting_engine.list_candidates(c), threads)
+    prefixes = [f"voter{rng.randrange(max(args.voters // 1000, 1)):05d}" for _ in range(args.queries)]
+    results["voter_page"] = run_operation(
+        path, prefixes, lambda c, p: voting_engine.page_voters(c, prefix=p, limit=200), threads)
+
+    results["reset"] = run_operation(path, list(range(args.resets)), lambda c, _: voting_engine.reset_election(c), threads)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the voting workflow and report JSON.")
+    parser.add_argument("--voters", type=int, default=100000, help="synthetic voters on the roll")
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of the vote distribution (0 = uniform)")
+    parser.add_argument("--registrations", type=int, default=200, help="voters registered and then logged in")
+    parser.add_argument("--casts", type=int, default=20000, help="ballots cast")
+    parser.add_argument("--queries", type=int, default=500, help="results queries and voter pages")
+    parser.add_argument("--resets", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8, help="threads in the concurrent mode")
+    parser.add_argument("--hash-cost", type=int, default=passwords.COST, help="password hashing cost for this run")
+    parser.add_argument("--verify-cache", action="store_true",
+                        help="keep the password verification cache on (off by default so every login runs the KDF)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-dir", help="directory for the databases (default: a temporary directory)")
+    args = parser.parse_args()
+
+    passwords.COST = args.hash_cost
+    if not args.verify_cache:
+        passwords.VERIFY_CACHE_SIZE = 0
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "config": {key: value for key, value in vars(args).items() if key != "db_dir"},
+        "modes": {},
+    }
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as tmp:
+        for mode, threads in (("single", 1), ("concurrent", args.threads)):
+            path = os.path.join(tmp, f"{mode}.db")
+            started = time.perf_counter()
+            operations = run_workflow(path, args, threads, random.Random(args.seed))
+            report["modes"][mode] = {
+                "threads": threads,
+                "total_seconds": time.perf_counter() - started,
+                "db_bytes": database_bytes(path),
+                "operations": operations,
+            }
+    passwords.shutdown()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()